@@ -1,27 +1,61 @@
 """A Google Cloud Python Pulumi program"""
 
+import pulumi
 from pulumi_gcp import compute, container, sql, storage
 from components.variables import region, zone, project_id, db_username, db_password
+from components.base import register_defaults
+from components.profiling import register_profiling
 from components.subnetwork import Subnetwork, SubnetworkArgs, IpRangeArgs
 from components.router import Router, RouterArgs
 from components.vpc import Vpc, VpcArgs, GlobalAddress, GlobalAddressArgs, ServiceNetworkingConnection, ServiceNetworkingConnectionArgs
 from components.nat import RouterNat, RouterNatArgs, RouterNatIpAddress, RouterNatIpAddressArgs
 from components.firewall import Firewall, FirewallArgs
-from components.kubernetes import KubernetesCluster, KubernetesClusterArgs
-from components.node_pool import NodePool, NodePoolArgs
+from components.kubernetes import KubernetesCluster, KubernetesClusterArgs, KubernetesProvider, KubernetesProviderArgs
+from components.node_pool import NodePool, NodePoolArgs, NodePoolScalingWindowArgs, surge_upgrade
+from components.overprovisioning import Overprovisioning, OverprovisioningArgs
 from components.sa import ServiceAccount, ServiceAccountArgs, IamBinding, IamBindingArgs, IamMember, IamMemberArgs
-from components.sql import DbInstance, DbInstanceArgs, Db, DbArgs, DbUser, DbUserArgs
-from components.gcs import StorageBucket, StorageBucketArgs, StorageBucketAcl, StorageBucketAclArgs
+from components.sql import DbInstance, DbInstanceArgs, Db, DbArgs, DbUser, DbUserArgs, clone_from
+from components.sql import DbTelemetryArgs, DbSlowQueryLog, DbSlowQueryLogArgs, DbScalingWindowArgs
+from components.gcs import StorageBucket, StorageBucketArgs, StorageBucketAcl, StorageBucketAclArgs, StorageBucketFuseMount, StorageBucketFuseMountArgs, FuseCacheArgs
 from components.gar import ArtifactRegistry, ArtifactRegistryArgs
-from components.disk import Disk, DiskArgs
+from components.cloudbuild import BuildWorkerPool, BuildWorkerPoolArgs
+from components.disk import Disk, DiskArgs, DiskSnapshotScheduleArgs
+from components.security_policy import SecurityPolicy, SecurityPolicyArgs, RateLimitRuleArgs, WafRuleArgs
+from components.load_balancer import LoadBalancer, LoadBalancerArgs, HealthCheckArgs
+from components.filestore import Filestore, FilestoreArgs, FilestoreVolume, FilestoreVolumeArgs
 
 # To run: pulumi up
 # To destroy: pulumi destroy
 # to sync with actual state of infra: pulumi refresh
+# Only the drift-prone resources that are due (cron friendly): python -m tools.drift_refresh [--apply]
+# Only the resources touched by the current git diff: python -m tools.targeted_deploy [preview|up]
+# Offline check of what the program registers against snapshots/gcp.json: python -m tools.plan_snapshot [check|update]
+# Offline capacity envelope and bottleneck of the declared stack: python -m tools.capacity
+# Per pull request environments on top of this stack (ephemeral/): python -m tools.ephemeral [up|destroy|gc]
+# Stack outputs for scripts, cached until the stack changes: python -m tools.stack_outputs [KEY ...]
 
 # The tricky part is destroying service network connection, 
 # when some other resources are dependent on it. 
 # The trick can be: delete directly on GCP and run pulumi refresh, then pulumi destroy
+# python -m tools.teardown does this unattended: destroys in dependency layers, waits for
+# the peering consumers (sql, filestore) and retries/removes the connection last
+
+# Clone mode, start a new environment (e.g. staging) with production data:
+#   pulumi config set cloneSqlInstance <production instance name>
+#   pulumi config set clonePointInTime 2024-01-01T00:00:00Z   (optional, latest point when unset)
+#   pulumi config set cloneDiskSnapshot <snapshot of the production disk>
+config = pulumi.Config()
+clone_sql_instance = config.get("cloneSqlInstance")
+clone_point_in_time = config.get("clonePointInTime")
+clone_disk_snapshot = config.get("cloneDiskSnapshot")
+
+# default custom timeouts for the slow resources (cluster, sql, peering...), see components/base.py
+register_defaults()
+
+# Opt-in profiling of the component constructors (time, tracemalloc, Outputs/applies):
+#   PULUMI_PROFILE_COMPONENTS=profile.txt pulumi preview   or   pulumi config set profileComponents profile.txt
+# also works offline: PULUMI_PROFILE_COMPONENTS=profile.txt python -m tools.plan_snapshot
+register_profiling(config.get("profileComponents"))
 
 # VPC
 vpc = Vpc(
@@ -142,7 +176,10 @@ kubernetes = KubernetesCluster(
         subnetwork=subnetwork.subnetwork,
         addons_config=container.ClusterAddonsConfigArgs(
             horizontal_pod_autoscaling=container.ClusterAddonsConfigHorizontalPodAutoscalingArgs(disabled=True),
-            http_load_balancing=container.ClusterAddonsConfigHorizontalPodAutoscalingArgs(disabled=True)
+            # container-native load balancing (NEGs) goes through the GKE ingress/gateway controller
+            http_load_balancing=container.ClusterAddonsConfigHttpLoadBalancingArgs(disabled=False),
+            gcs_fuse_csi_driver_config=container.ClusterAddonsConfigGcsFuseCsiDriverConfigArgs(enabled=True),
+            gcp_filestore_csi_driver_config=container.ClusterAddonsConfigGcpFilestoreCsiDriverConfigArgs(enabled=True)
         ),
         release_channel=container.ClusterReleaseChannelArgs(channel="REGULAR"),
         ip_allocation_policy=container.ClusterIpAllocationPolicyArgs(
@@ -165,10 +202,102 @@ kubernetes = KubernetesCluster(
         monitoring_service=None,
         networking_mode="VPC_NATIVE",
         deletion_protection=False,
+        gateway_api_config=container.ClusterGatewayApiConfigArgs(channel="CHANNEL_STANDARD"),
+        # auto-upgrades only off-peak (weekend nights UTC), add maintenance_exclusions
+        # to freeze upgrades around launches. GKE rejects policies with less than 48h of
+        # maintenance availability per 32 days (in windows of at least 4h): 2 x 6h a week
+        # gives ~55h, don't shorten it below that.
+        maintenance_policy=container.ClusterMaintenancePolicyArgs(
+            recurring_window=container.ClusterMaintenancePolicyRecurringWindowArgs(
+                start_time="2024-01-06T01:00:00Z",
+                end_time="2024-01-06T07:00:00Z",
+                recurrence="FREQ=WEEKLY;BYDAY=SA,SU"
+            )
+        ),
         depends_on=[service_networking_connection.service_networking_connection, vpc.vpc]
     )
 )
 
+# Kubernetes provider for in-cluster resources
+kubernetes_provider = KubernetesProvider(
+    "onxp-k8s",
+    "gcp:modules:kubernetes:provider:onxp",
+    KubernetesProviderArgs(
+        cluster=kubernetes.cluster
+    )
+)
+
+# Cloud Armor: rate limit and ban abusive clients at the edge, before they cost pods or Cloud SQL
+security_policy = SecurityPolicy(
+    "onxp-armor",
+    "gcp:modules:securitypolicy:onxp",
+    SecurityPolicyArgs(
+        name="onxp-armor",
+        waf_rules=[
+            WafRuleArgs(priority=1000, rule_set="sqli-v33-stable"),
+            WafRuleArgs(priority=1001, rule_set="xss-v33-stable")
+        ],
+        rate_limits=[
+            # requests above 300/min per client get a 429,
+            # clients above 1200/min are banned for 5 minutes
+            RateLimitRuleArgs(priority=2000, action="rate_based_ban", count=300, interval_sec=60,
+                              ban_count=1200, ban_interval_sec=60, ban_duration_sec=300)
+        ],
+        adaptive_protection=True
+    )
+)
+
+# Publish the exercise app through a Gateway with NEG backends (pods are load balanced directly)
+load_balancer = LoadBalancer(
+    "onxp-lb",
+    "gcp:modules:loadbalancer:onxp",
+    LoadBalancerArgs(
+        name="onxp-exercise",
+        namespace="exercise",
+        provider=kubernetes_provider.provider,
+        network=vpc.vpc,
+        selector={"app": "onxp-exercise"},
+        port=80,
+        target_port=8080,
+        protocol="HTTP2",
+        health_check=HealthCheckArgs(request_path="/healthz"),
+        backend_timeout_sec=30,
+        connection_draining_timeout_sec=30,
+        session_affinity="CLIENT_IP",
+        target_tags=["http-server"],
+        security_policy=security_policy.security_policy
+    )
+)
+
+# Service account the scheduled scaling jobs (node pool bounds, sql tier) run as
+scaler_sa = ServiceAccount(
+    "onxp-scaler-sa",
+    "gcp:modules:scaling:sa:onxp",
+    ServiceAccountArgs(
+        name="onxp-scaler-sa",
+        account_id="onxp-scaler-sa",
+        project_id=project_id
+    )
+)
+
+scaler_cluster_iam_member = IamMember(
+    "onxp-scaler-cluster-iam-member",
+    "gcp:modules:scaling:sa:iam:onxp",
+    IamMemberArgs(
+        role="roles/container.clusterAdmin",
+        serviceaccount=scaler_sa.service_account
+    )
+)
+
+scaler_sql_iam_member = IamMember(
+    "onxp-scaler-sql-iam-member",
+    "gcp:modules:scaling:sa:iam:onxp",
+    IamMemberArgs(
+        role="roles/cloudsql.editor",
+        serviceaccount=scaler_sa.service_account
+    )
+)
+
 # Create service account for nodepool
 node_pool_sa = ServiceAccount(
     "onxp-nodepool-sa",
@@ -195,7 +324,12 @@ node_pool = NodePool(
             service_account=node_pool_sa.service_account.email.apply(lambda email: email),
             oauth_scopes = [
                 "https://www.googleapis.com/auth/cloud-platform"
-            ]
+            ],
+            tags=["http-server"],
+            # needed for workload identity (and the GCS FUSE sidecar)
+            workload_metadata_config=container.ClusterNodeConfigWorkloadMetadataConfigArgs(
+                mode="GKE_METADATA"
+            )
         ),
         autoscaling=container.NodePoolAutoscalingArgs(
             min_node_count=1,
@@ -207,7 +341,28 @@ node_pool = NodePool(
             auto_upgrade=True
         ),
         node_count=1,
-        node_locations=[zone]
+        node_locations=[zone],
+        # add a node before draining one, so upgrades never drop serving capacity
+        upgrade_settings=surge_upgrade(max_surge=1, max_unavailable=0),
+        # weekday business hours peak
+        scaling_windows=[
+            NodePoolScalingWindowArgs("weekday-peak", start="0 8 * * 1-5", end="0 20 * * 1-5",
+                                      min_node_count=2, max_node_count=4)
+        ],
+        scaling_service_account=scaler_sa.service_account.email
+    )
+)
+
+# Headroom: low-priority placeholder pods worth 25% of the pool, preempted by real pods
+# so bursts schedule immediately while the autoscaler boots the replacement node
+overprovisioning = Overprovisioning(
+    "onxp-headroom",
+    "gcp:modules:kubernetes:overprovisioning:onxp",
+    OverprovisioningArgs(
+        node_pool=node_pool,
+        provider=kubernetes_provider.provider,
+        fraction=0.25,
+        pod_fraction_of_node=0.5
     )
 )
 
@@ -230,6 +385,8 @@ db_instance = DbInstance(
             backup_configuration=sql.DatabaseInstanceSettingsBackupConfigurationArgs(
                 enabled=True,
                 location=region,
+                # point in time recovery, also what clones are created from
+                point_in_time_recovery_enabled=True,
                 transaction_log_retention_days=7,
                 backup_retention_settings=sql.DatabaseInstanceSettingsBackupConfigurationBackupRetentionSettingsArgs(
                     retained_backups=7
@@ -239,34 +396,61 @@ db_instance = DbInstance(
                 ipv4_enabled=True,
                 private_network=vpc.vpc.id
             ),
-            insights_config=sql.DatabaseInstanceSettingsInsightsConfigArgs(
-                query_insights_enabled=True
-            ),
         ),
+        # pg_stat_statements, auto_explain, slow statement log and Query Insights sampling
+        telemetry=DbTelemetryArgs(
+            log_min_duration_statement_ms=500,
+            query_string_length=1024,
+            query_plans_per_minute=5
+        ),
+        # weekday business hours peak, a tier change restarts the instance
+        scaling_windows=[
+            DbScalingWindowArgs("weekday-peak", start="0 8 * * 1-5", end="0 20 * * 1-5", tier="db-g1-small")
+        ],
+        scaling_service_account=scaler_sa.service_account.email,
+        clone=clone_from(
+            clone_sql_instance,
+            point_in_time=clone_point_in_time,
+            allocated_ip_range=global_address.global_address.name
+        ) if clone_sql_instance else None,
         depends_on=[service_networking_connection.service_networking_connection, vpc.vpc]
     )
 )
 
-# create database
-db = Db(
-    "onxp-production",
-    "gcp:modules:sql:database:onxpprod",
-    DbArgs(
-        "onxp-production",
-        instance=db_instance.database_instance.name
+# keep the slow query history (statements and plans) in a bucket
+db_slow_query_log = DbSlowQueryLog(
+    "onxp-sql-slow-queries",
+    "gcp:modules:sql:slowquerylog:onxp",
+    DbSlowQueryLogArgs(
+        instance=db_instance.database_instance,
+        bucket_name="onxp-sql-slow-queries",
+        nearline_after_days=30,
+        retention_days=365
     )
 )
 
-# Create db user
-db = DbUser(
-    "onxp-db-user",
-    "gcp:modules:sql:user:onxp",
-    DbUserArgs(
-        name=db_username,
-        password=db_password,
-        instance=db_instance.database_instance.name
+# a clone already comes with the database and its users
+if not clone_sql_instance:
+    # create database
+    db = Db(
+        "onxp-production",
+        "gcp:modules:sql:database:onxpprod",
+        DbArgs(
+            "onxp-production",
+            instance=db_instance.database_instance.name
+        )
+    )
+
+    # Create db user
+    db_user = DbUser(
+        "onxp-db-user",
+        "gcp:modules:sql:user:onxp",
+        DbUserArgs(
+            name=db_username,
+            password=db_password,
+            instance=db_instance.database_instance.name
+        )
     )
-)
 
 # Create service account, can be used in k8s cluster
 db_sa = ServiceAccount(
@@ -366,6 +550,30 @@ bucket_acl = StorageBucketAcl(
     )
 )
 
+# mount bucket into workloads through the GCS FUSE CSI driver,
+# add bucket_fuse_mount.pod_annotations / volume / volume_mount to the pod spec
+bucket_fuse_mount = StorageBucketFuseMount(
+    "onxp-bucket-fuse",
+    "gcp:modules:storage:bucket:fuse:onxp",
+    StorageBucketFuseMountArgs(
+        bucket=storage_bucket.storage,
+        project_id=project_id,
+        namespace="exercise",
+        kubernetes_service_account="onxp-exercise-sa",
+        volume_name="onxp-bucket",
+        mount_path="/data",
+        read_only=True,
+        cache=FuseCacheArgs(
+            file_cache_size_mb=10240,
+            cache_file_for_range_read=True,
+            metadata_cache_ttl_secs=600,
+            parallel_downloads=True,
+            read_ahead_kb=1024
+        ),
+        sidecar_ephemeral_storage_limit="12Gi"
+    )
+)
+
 # Create GAR
 gar = ArtifactRegistry(
     "onxp-gar",
@@ -398,6 +606,21 @@ gar_iam_member = IamMember(
     )
 )
 
+# Private Cloud Build pool for the onxp-gar images, peered into the VPC with a build cache
+build_worker_pool = BuildWorkerPool(
+    "onxp-build",
+    "gcp:modules:cloudbuild:workerpool:onxp",
+    BuildWorkerPoolArgs(
+        name="onxp-build",
+        network=vpc.vpc,
+        machine_type="e2-standard-4",
+        disk_size_gb=100,
+        cache_retention_days=14,
+        push_repositories={"onxp-gar": gar.artifact_registry},
+        depends_on=[service_networking_connection.service_networking_connection]
+    )
+)
+
 # Create disk
 disk = Disk(
     "onxp-disk",
@@ -406,6 +629,80 @@ disk = Disk(
         name="onxp-disk",
         zone=zone,
         size=10,
-        physical_block_size_bytes=4096
+        physical_block_size_bytes=4096,
+        snapshot=clone_disk_snapshot,
+        # daily snapshots, kept a week, to clone other environments from
+        snapshot_schedule=DiskSnapshotScheduleArgs(start_time="03:00", max_retention_days=7)
+    )
+)
+
+# Create Filestore, shared ReadWriteMany storage for the cluster
+filestore = Filestore(
+    "onxp-filestore",
+    "gcp:modules:filestore:onxp",
+    FilestoreArgs(
+        name="onxp-filestore",
+        network=vpc.vpc,
+        tier="zonal",
+        target_read_mibps=250,
+        location=zone,
+        reserved_ip_range=global_address.global_address,
+        depends_on=[service_networking_connection.service_networking_connection]
+    )
+)
+
+filestore_volume = FilestoreVolume(
+    "onxp-filestore-pv",
+    "gcp:modules:filestore:volume:onxp",
+    FilestoreVolumeArgs(
+        filestore=filestore,
+        provider=kubernetes_provider.provider,
+        storage_class_name="onxp-filestore",
+        namespace="exercise",
+        claim_name="onxp-shared"
     )
-)
\ No newline at end of file
+)
+
+# Outputs the ephemeral environments (ephemeral/) read through a stack reference
+pulumi.export("projectId", project_id)
+pulumi.export("clusterName", kubernetes.cluster.name)
+pulumi.export("clusterEndpoint", kubernetes.cluster.endpoint)
+pulumi.export("clusterCaCertificate", kubernetes.cluster.master_auth.cluster_ca_certificate)
+pulumi.export("sqlInstanceName", db_instance.database_instance.name)
+pulumi.export("bucketName", storage_bucket.storage.name)
+
+# Structured outputs for scripts and app config, read them with tools.stack_outputs
+# (cached locally) instead of `pulumi stack output`
+def registry_url(repository: ArtifactRegistry):
+    repository = repository.artifact_registry
+    return pulumi.Output.concat(repository.location, "-docker.pkg.dev/", project_id, "/", repository.repository_id)
+
+pulumi.export("cluster", {
+    "name": kubernetes.cluster.name,
+    "location": kubernetes.cluster.location,
+    "endpoint": kubernetes.cluster.endpoint,
+})
+pulumi.export("sql", {
+    "onxp-sql": {
+        "name": db_instance.database_instance.name,
+        "connectionName": db_instance.database_instance.connection_name,
+        "privateIp": db_instance.database_instance.private_ip_address,
+    },
+})
+pulumi.export("buckets", {
+    "onxp-bucket": storage_bucket.storage.url,
+    "onxp-sql-slow-queries": db_slow_query_log.bucket.storage.url,
+    "onxp-build-cache": build_worker_pool.cache_bucket.storage.url,
+})
+pulumi.export("registries", {
+    "onxp-gar": registry_url(gar),
+    "onxp-build-cache": registry_url(build_worker_pool.cache_repository),
+})
+pulumi.export("serviceAccounts", {
+    "onxp-nodepool-sa": node_pool_sa.service_account.email,
+    "onxp-db-sa": db_sa.service_account.email,
+    "onxp-bucket-sa": bucket_sa.service_account.email,
+    "onxp-gar-sa": gar_sa.service_account.email,
+    "onxp-scaler-sa": scaler_sa.service_account.email,
+    "onxp-build-sa": build_worker_pool.service_account.service_account.email,
+})
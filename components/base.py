@@ -0,0 +1,101 @@
+import re
+import time
+from typing import Mapping, Sequence
+import pulumi
+from pulumi import CustomTimeouts, ResourceOptions
+
+# Default create/update/delete timeouts for the slow GCP resources, keyed by resource type.
+# Applied to every resource the program registers unless it sets its own custom_timeouts.
+DEFAULT_CUSTOM_TIMEOUTS = {
+    "gcp:container/cluster:Cluster": CustomTimeouts(create="45m", update="60m", delete="45m"),
+    # upgrades roll node by node
+    "gcp:container/nodePool:NodePool": CustomTimeouts(create="30m", update="90m", delete="30m"),
+    "gcp:sql/databaseInstance:DatabaseInstance": CustomTimeouts(create="60m", update="60m", delete="30m"),
+    "gcp:servicenetworking/connection:Connection": CustomTimeouts(create="20m", update="20m", delete="20m"),
+    "gcp:filestore/instance:Instance": CustomTimeouts(create="30m", update="30m", delete="30m"),
+}
+
+class RetryPolicy:
+    def __init__(self,
+                 max_attempts: int=4,
+                 initial_delay: float=30,
+                 max_delay: float=300,
+                 multiplier: float=2,
+                 transient_errors: Sequence[str]=None):
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        # regexes matched, case sensitive, against the error lines of the operation's output
+        self.transient_errors = [re.compile(pattern) for pattern in (transient_errors or TRANSIENT_ERRORS)]
+
+    def is_transient(self, message: str) -> bool:
+        return any(pattern.search(line) for line in error_lines(message) for pattern in self.transient_errors)
+
+    def delays(self):
+        delay = self.initial_delay
+        for _ in range(self.max_attempts - 1):
+            yield min(delay, self.max_delay)
+            delay *= self.multiplier
+
+    def run(self, operation, on_retry=None):
+        """Runs operation(), retrying with exponential backoff while it fails with a transient error."""
+        delays = self.delays()
+        while True:
+            try:
+                return operation()
+            except Exception as e:
+                delay = next(delays, None)
+                if delay is None or not self.is_transient(str(e)):
+                    raise
+                if on_retry is not None:
+                    on_retry(e, delay)
+                time.sleep(delay)
+
+def error_lines(message: str):
+    """The lines of a failed operation's message worth matching. An Automation API CommandError
+    carries the whole stdout of the run (resource names, program output...): only its stderr and
+    the stdout lines mentioning an error are kept."""
+    stdout, separator, stderr = message.partition("\n stderr: ")
+    if not separator:
+        return message.splitlines()
+    return [line for line in stdout.splitlines() if "error" in line.lower()] + stderr.splitlines()
+
+# Errors GCP returns for conflicts with in-flight operations, throttling and backend hiccups.
+# Rerunning the operation picks up from the saved state, so these are safe to retry. A bare 409
+# isn't: "already exists" conflicts fail the same way on every attempt.
+TRANSIENT_ERRORS = [
+    r"Error 429",
+    r"Error 50[023]",
+    r"(?i)operation .* (is )?(already )?in progress",
+    r"(?i)another operation .* is in progress",
+    r"(?i)concurrent (policy )?(changes|modification)",
+    r"rateLimitExceeded",
+    # gRPC status codes, as the API returns them and as Go prints them
+    r"\bRESOURCE_EXHAUSTED\b",
+    r"\bUNAVAILABLE\b",
+    r"code = (ResourceExhausted|Unavailable)\b",
+    r"connection reset by peer",
+    r"i/o timeout",
+    r"TLS handshake timeout",
+]
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+def custom_timeouts_transformation(timeouts: Mapping[str, CustomTimeouts]):
+    def transformation(args: pulumi.ResourceTransformationArgs):
+        default = timeouts.get(args.type_)
+        if default is None or args.opts.custom_timeouts is not None:
+            return None
+        return pulumi.ResourceTransformationResult(
+            args.props,
+            ResourceOptions.merge(args.opts, ResourceOptions(custom_timeouts=default)))
+    return transformation
+
+def register_defaults(custom_timeouts: Mapping[str, CustomTimeouts]=None):
+    """Call once at the top of the program, before any component is created.
+    custom_timeouts overrides/extends DEFAULT_CUSTOM_TIMEOUTS per resource type."""
+    timeouts = dict(DEFAULT_CUSTOM_TIMEOUTS)
+    timeouts.update(custom_timeouts or {})
+    # a stack transformation also reaches the resources components create without parent=self
+    pulumi.runtime.register_stack_transformation(custom_timeouts_transformation(timeouts))
@@ -0,0 +1,132 @@
+from typing import Dict
+from pulumi import ComponentResource, ResourceOptions
+from pulumi_gcp import artifactregistry, cloudbuild, compute, storage
+from components.gar import ArtifactRegistry, ArtifactRegistryArgs
+from components.gcs import StorageBucket, StorageBucketArgs
+from components.sa import ServiceAccount, ServiceAccountArgs, IamMember, IamMemberArgs
+from components.variables import region, project_id
+
+# Project level roles the build service account needs to run on the pool, pushing images and
+# using the caches is granted on the repositories and the cache bucket only
+BUILD_ROLES = [
+    "roles/cloudbuild.workerPoolUser",
+    "roles/logging.logWriter",
+]
+
+class BuildWorkerPoolArgs:
+    def __init__(self,
+                 name: str,
+                 network: compute.Network,
+                 peered_network_ip_range: str="/29",
+                 machine_type: str="e2-standard-4",
+                 disk_size_gb: int=100,
+                 no_external_ip: bool=False,
+                 cache_retention_days: int=14,
+                 push_repositories: Dict[str, artifactregistry.Repository]=None,
+                 region=region,
+                 depends_on=None,
+                 ):
+        self.name = name
+        # peered through the network's service networking connection, pass the connection in depends_on
+        self.network = network
+        # carved out of the connection's reserved range, /29 is enough for a small pool
+        self.peered_network_ip_range = peered_network_ip_range
+        self.machine_type = machine_type
+        self.disk_size_gb = disk_size_gb
+        # the peered producer network isn't behind our Cloud NAT, workers without an external
+        # ip only reach the VPC and Google APIs
+        self.no_external_ip = no_external_ip
+        # cached layers and objects older than this are deleted
+        self.cache_retention_days = cache_retention_days
+        # {name: repository} the builds push images to, the cache repository is always writable
+        self.push_repositories = push_repositories or {}
+        self.region = region
+        self.depends_on = depends_on
+
+# Private Cloud Build pool inside the VPC, with a layer cache repository (e.g. kaniko
+# --cache-repo or buildx --cache-to) and a cache bucket for dependency archives.
+# https://www.pulumi.com/registry/packages/gcp/api-docs/cloudbuild/workerpool/
+class BuildWorkerPool(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: BuildWorkerPoolArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+
+        self.worker_pool = cloudbuild.WorkerPool(
+            resource_name=name,
+            name=args.name,
+            location=args.region,
+            network_config=cloudbuild.WorkerPoolNetworkConfigArgs(
+                peered_network=args.network.id,
+                peered_network_ip_range=args.peered_network_ip_range),
+            worker_config=cloudbuild.WorkerPoolWorkerConfigArgs(
+                machine_type=args.machine_type,
+                disk_size_gb=args.disk_size_gb,
+                no_external_ip=args.no_external_ip),
+            opts=ResourceOptions(parent=self, depends_on=args.depends_on))
+
+        self.cache_repository = ArtifactRegistry(
+            name + "-cache",
+            "gcp:modules:artifactregistry:repository:buildcache",
+            ArtifactRegistryArgs(
+                repository_id=args.name + "-cache",
+                location=args.region,
+                format="DOCKER",
+                cleanup_policies=[artifactregistry.RepositoryCleanupPolicyArgs(
+                    id="expire-cache",
+                    action="DELETE",
+                    condition=artifactregistry.RepositoryCleanupPolicyConditionArgs(
+                        tag_state="ANY",
+                        older_than="%dd" % args.cache_retention_days))]),
+            opts=ResourceOptions(parent=self))
+
+        self.cache_bucket = StorageBucket(
+            name + "-cache",
+            "gcp:modules:storage:bucket:buildcache",
+            StorageBucketArgs(
+                name + "-cache",
+                location=args.region,
+                storage_class="STANDARD",
+                uniform_bucket_level_access=True,
+                lifecycle_rules=[storage.BucketLifecycleRuleArgs(
+                    condition=storage.BucketLifecycleRuleConditionArgs(age=args.cache_retention_days),
+                    action=storage.BucketLifecycleRuleActionArgs(type="Delete"))],
+                versioning=storage.BucketVersioningArgs(enabled=False)),
+            opts=ResourceOptions(parent=self))
+
+        # builds submitted with --service-account run as this account
+        self.service_account = ServiceAccount(
+            name + "-sa",
+            "gcp:modules:cloudbuild:sa:onxp",
+            ServiceAccountArgs(name=args.name + "-sa", account_id=args.name + "-sa", project_id=project_id),
+            opts=ResourceOptions(parent=self))
+        self.iam_members = [
+            IamMember(
+                name + "-" + role.split("/")[-1].replace(".", "-").lower(),
+                "gcp:modules:cloudbuild:sa:iam:onxp",
+                IamMemberArgs(role=role, serviceaccount=self.service_account.service_account),
+                opts=ResourceOptions(parent=self))
+            for role in BUILD_ROLES]
+
+        member = self.service_account.service_account.email.apply(lambda email: "serviceAccount:" + email)
+        self.cache_bucket_iam_member = storage.BucketIAMMember(
+            resource_name=name + "-cache-objectadmin",
+            bucket=self.cache_bucket.storage.name,
+            role="roles/storage.objectAdmin",
+            member=member,
+            opts=ResourceOptions(parent=self))
+        # https://www.pulumi.com/registry/packages/gcp/api-docs/artifactregistry/repositoryiammember/
+        repositories = {name + "-cache": self.cache_repository.artifact_registry, **args.push_repositories}
+        self.repository_iam_members = [
+            artifactregistry.RepositoryIamMember(
+                resource_name=repository_name + "-writer",
+                location=repository.location,
+                repository=repository.name,
+                role="roles/artifactregistry.writer",
+                member=member,
+                opts=ResourceOptions(parent=self))
+            for repository_name, repository in repositories.items()]
+
+        self.register_outputs({})
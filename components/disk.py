@@ -2,17 +2,34 @@ from pulumi import ComponentResource, ResourceOptions
 from pulumi_gcp import compute
 from components.variables import zone
 
+class DiskSnapshotScheduleArgs:
+    def __init__(self,
+                 start_time: str="03:00",
+                 days_in_cycle: int=1,
+                 max_retention_days: int=7,
+                 ):
+        self.start_time = start_time
+        self.days_in_cycle = days_in_cycle
+        self.max_retention_days = max_retention_days
+
 class DiskArgs:
     def __init__(self,
                  name: str,
                  zone=zone,
                  size: int=10,
                  physical_block_size_bytes: int=4096,
+                 snapshot: str=None,
+                 snapshot_schedule: DiskSnapshotScheduleArgs=None,
                  ):
         self.name = name
         self.zone = zone
         self.size = size
         self.physical_block_size_bytes = physical_block_size_bytes
+        # clone mode: create the disk from this snapshot (name or self link)
+        # instead of empty, size must be at least the snapshot's source disk size
+        self.snapshot = snapshot
+        # regular snapshots of this disk, e.g. so other environments can clone it
+        self.snapshot_schedule = snapshot_schedule
 
 # https://www.pulumi.com/registry/packages/gcp/api-docs/compute/disk/
 class Disk(ComponentResource):
@@ -28,6 +45,28 @@ class Disk(ComponentResource):
             zone=args.zone,
             size=args.size,
             physical_block_size_bytes=args.physical_block_size_bytes,
+            snapshot=args.snapshot,
             opts=ResourceOptions(parent=self))
+
+        if args.snapshot_schedule is not None:
+            # https://www.pulumi.com/registry/packages/gcp/api-docs/compute/resourcepolicy/
+            self.snapshot_policy = compute.ResourcePolicy(
+                resource_name=name + "-snapshots",
+                region=args.zone[:args.zone.rindex("-")],
+                snapshot_schedule_policy=compute.ResourcePolicySnapshotSchedulePolicyArgs(
+                    schedule=compute.ResourcePolicySnapshotSchedulePolicyScheduleArgs(
+                        daily_schedule=compute.ResourcePolicySnapshotSchedulePolicyScheduleDailyScheduleArgs(
+                            days_in_cycle=args.snapshot_schedule.days_in_cycle,
+                            start_time=args.snapshot_schedule.start_time)),
+                    retention_policy=compute.ResourcePolicySnapshotSchedulePolicyRetentionPolicyArgs(
+                        max_retention_days=args.snapshot_schedule.max_retention_days,
+                        on_source_disk_delete="KEEP_AUTO_SNAPSHOTS")),
+                opts=ResourceOptions(parent=self))
+            self.snapshot_policy_attachment = compute.DiskResourcePolicyAttachment(
+                resource_name=name + "-snapshots",
+                disk=self.disk.name,
+                zone=args.zone,
+                name=self.snapshot_policy.name,
+                opts=ResourceOptions(parent=self))
         self.register_outputs({})
     
\ No newline at end of file
@@ -0,0 +1,87 @@
+from pulumi import ComponentResource, ResourceOptions, StackReference, Output
+import pulumi_kubernetes as k8s
+from pulumi_gcp import serviceaccount
+from components.kubernetes import kubeconfig
+from components.sa import ServiceAccount, ServiceAccountArgs
+from components.sql import Db, DbArgs, DbUser, DbUserArgs
+
+class EphemeralEnvironmentArgs:
+    def __init__(self,
+                 name: str,
+                 base_stack: str,
+                 db_password,
+                 project_id: str,
+                 ):
+        # short and dns friendly, e.g. pr-123: used for the namespace, database, user
+        # and service account
+        self.name = name
+        # fully qualified base stack, e.g. organization/pulumi-exercise/gcp
+        self.base_stack = base_stack
+        self.db_password = db_password
+        self.project_id = project_id
+
+# Lightweight per-environment slice of a base stack: reuses its VPC, cluster and SQL instance
+# through a stack reference and only creates what is specific to the environment.
+# https://www.pulumi.com/docs/using-pulumi/stack-outputs-and-references/
+class EphemeralEnvironment(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: EphemeralEnvironmentArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+
+        self.base = StackReference(args.base_stack, opts=ResourceOptions(parent=self))
+        sql_instance = self.base.require_output("sqlInstanceName")
+
+        self.provider = k8s.Provider(
+            resource_name=name,
+            kubeconfig=Output.all(
+                self.base.require_output("clusterName"),
+                self.base.require_output("clusterEndpoint"),
+                self.base.require_output("clusterCaCertificate")
+            ).apply(lambda values: kubeconfig(*values)),
+            opts=ResourceOptions(parent=self))
+
+        self.database = Db(
+            name + "-db",
+            "gcp:modules:sql:database:ephemeral",
+            DbArgs(name=args.name, instance=sql_instance),
+            opts=ResourceOptions(parent=self))
+        self.database_user = DbUser(
+            name + "-db-user",
+            "gcp:modules:sql:user:ephemeral",
+            DbUserArgs(name=args.name, password=args.db_password, instance=sql_instance),
+            opts=ResourceOptions(parent=self))
+
+        self.namespace = k8s.core.v1.Namespace(
+            resource_name=name,
+            metadata=k8s.meta.v1.ObjectMetaArgs(name=args.name, labels={"ephemeral": "true"}),
+            opts=ResourceOptions(parent=self, provider=self.provider))
+
+        # workload identity: pods running as the namespace's KSA act as this service account
+        self.service_account = ServiceAccount(
+            name + "-sa",
+            "gcp:modules:sa:ephemeral",
+            ServiceAccountArgs(name="onxp-" + args.name, account_id="onxp-" + args.name, project_id=args.project_id),
+            opts=ResourceOptions(parent=self))
+        email = self.service_account.service_account.email
+        self.workload_identity_user = serviceaccount.IAMMember(
+            resource_name=name + "-workload-identity",
+            service_account_id=self.service_account.service_account.name,
+            role="roles/iam.workloadIdentityUser",
+            member="serviceAccount:%s.svc.id.goog[%s/%s]" % (args.project_id, args.name, args.name),
+            opts=ResourceOptions(parent=self))
+        self.kubernetes_service_account = k8s.core.v1.ServiceAccount(
+            resource_name=name,
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=args.name,
+                namespace=self.namespace.metadata.name,
+                annotations={"iam.gke.io/gcp-service-account": email}),
+            opts=ResourceOptions(parent=self, provider=self.provider))
+
+        # No bucket access: the base bucket is shared with production and uses fine-grained ACLs,
+        # so a grant can't be pinned to a pr-<n>/ prefix. Give environments their own bucket (or a
+        # managed folder on a uniform bucket level access bucket) before granting storage roles.
+
+        self.register_outputs({})
@@ -0,0 +1,186 @@
+import math
+from pulumi import ComponentResource, ResourceOptions
+from pulumi_gcp import compute, filestore
+import pulumi_kubernetes as k8s
+from components.variables import zone
+
+class FilestoreTier:
+    def __init__(self,
+                 name: str,
+                 min_capacity_gb: int,
+                 max_capacity_gb: int,
+                 capacity_step_gb: int,
+                 read_mibps_per_tib: float,
+                 max_read_mibps: float):
+        self.name = name
+        self.min_capacity_gb = min_capacity_gb
+        self.max_capacity_gb = max_capacity_gb
+        self.capacity_step_gb = capacity_step_gb
+        self.read_mibps_per_tib = read_mibps_per_tib
+        self.max_read_mibps = max_read_mibps
+
+    def read_throughput(self, capacity_gb: int) -> float:
+        return min(self.max_read_mibps, self.read_mibps_per_tib * capacity_gb / 1024)
+
+# Read throughput per tier, from https://cloud.google.com/filestore/docs/performance
+# BASIC_SSD is flat, BASIC_HDD is flat below 10 TiB; zonal and enterprise scale with capacity.
+FILESTORE_TIERS = {
+    "BASIC_HDD": FilestoreTier("BASIC_HDD", 1024, 65434, 1, 0, 100),
+    "BASIC_SSD": FilestoreTier("BASIC_SSD", 2560, 65434, 1, 0, 1200),
+    "ZONAL": FilestoreTier("ZONAL", 1024, 9984, 256, 260, 2560),
+    "ENTERPRISE": FilestoreTier("ENTERPRISE", 1024, 9984, 256, 120, 1200),
+}
+
+def filestore_tier(tier: str, target_read_mibps: float=None) -> FilestoreTier:
+    tier = tier.upper()
+    if tier == "BASIC":
+        # HDD is plenty until the target needs SSD
+        tier = "BASIC_HDD" if (target_read_mibps or 0) <= FILESTORE_TIERS["BASIC_HDD"].max_read_mibps else "BASIC_SSD"
+    if tier not in FILESTORE_TIERS:
+        raise ValueError("unknown filestore tier {}, expected one of basic, {}".format(
+            tier, ", ".join(t.lower() for t in FILESTORE_TIERS)))
+    return FILESTORE_TIERS[tier]
+
+def capacity_for_throughput(tier: FilestoreTier, target_read_mibps: float) -> int:
+    if target_read_mibps > tier.max_read_mibps:
+        raise ValueError("{} tops out at {} MiB/s read, {} MiB/s requested".format(
+            tier.name, tier.max_read_mibps, target_read_mibps))
+    if tier.read_mibps_per_tib == 0:
+        return tier.min_capacity_gb
+    capacity_gb = math.ceil(target_read_mibps / tier.read_mibps_per_tib * 1024)
+    capacity_gb = math.ceil(capacity_gb / tier.capacity_step_gb) * tier.capacity_step_gb
+    return max(tier.min_capacity_gb, capacity_gb)
+
+class FilestoreArgs:
+    def __init__(self,
+                 name: str,
+                 network: compute.Network,
+                 tier: str="zonal",
+                 capacity_gb: int=None,
+                 target_read_mibps: float=None,
+                 share_name: str="share1",
+                 location: str=zone,
+                 connect_mode="PRIVATE_SERVICE_ACCESS",
+                 reserved_ip_range: compute.GlobalAddress=None,
+                 depends_on=None
+                 ):
+        if capacity_gb is None and target_read_mibps is None:
+            raise ValueError("either capacity_gb or target_read_mibps is required")
+        self.name = name
+        self.network = network
+        self.tier = filestore_tier(tier, target_read_mibps)
+        self.capacity_gb = capacity_gb if capacity_gb is not None else capacity_for_throughput(self.tier, target_read_mibps)
+        self.share_name = share_name
+        self.location = location
+        self.connect_mode = connect_mode
+        self.reserved_ip_range = reserved_ip_range
+        self.depends_on = depends_on
+
+# https://www.pulumi.com/registry/packages/gcp/api-docs/filestore/instance/
+class Filestore(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: FilestoreArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+
+        self.tier = args.tier
+        self.capacity_gb = args.capacity_gb
+        self.location = args.location
+        self.share_name = args.share_name
+        self.reserved_ip_range = args.reserved_ip_range
+        self.instance = filestore.Instance(
+            resource_name=name,
+            name=args.name,
+            location=args.location,
+            tier=args.tier.name,
+            file_shares=filestore.InstanceFileSharesArgs(
+                name=args.share_name,
+                capacity_gb=args.capacity_gb),
+            networks=[filestore.InstanceNetworkArgs(
+                network=args.network.name,
+                modes=["MODE_IPV4"],
+                connect_mode=args.connect_mode,
+                reserved_ip_range=args.reserved_ip_range.name if args.reserved_ip_range else None)],
+            opts=ResourceOptions(parent=self, depends_on=args.depends_on))
+        self.register_outputs({})
+
+class FilestoreVolumeArgs:
+    def __init__(self,
+                 filestore: Filestore,
+                 provider: k8s.Provider,
+                 storage_class_name: str,
+                 namespace: str=None,
+                 claim_name: str=None,
+                 ):
+        self.filestore = filestore
+        self.provider = provider
+        self.storage_class_name = storage_class_name
+        self.namespace = namespace
+        self.claim_name = claim_name
+
+# Exposes an existing Filestore share to the cluster as a ReadWriteMany PersistentVolume
+# (through the Filestore CSI driver), plus a StorageClass of the same tier for dynamic shares.
+# https://cloud.google.com/filestore/docs/filestore-for-gke
+class FilestoreVolume(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: FilestoreVolumeArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+        child_opts = ResourceOptions(parent=self, provider=args.provider)
+
+        instance = args.filestore.instance
+        parameters = {
+            "tier": args.filestore.tier.name.lower().replace("_", "-"),
+            "network": instance.networks[0].network,
+            "connect-mode": instance.networks[0].connect_mode,
+        }
+        if args.filestore.reserved_ip_range is not None:
+            parameters["reserved-ip-range"] = args.filestore.reserved_ip_range.name
+        self.storage_class = k8s.storage.v1.StorageClass(
+            resource_name=name,
+            metadata=k8s.meta.v1.ObjectMetaArgs(name=args.storage_class_name),
+            provisioner="filestore.csi.storage.gke.io",
+            parameters=parameters,
+            volume_binding_mode="Immediate",
+            allow_volume_expansion=True,
+            opts=child_opts)
+
+        self.persistent_volume = k8s.core.v1.PersistentVolume(
+            resource_name=name,
+            metadata=k8s.meta.v1.ObjectMetaArgs(name=name),
+            spec=k8s.core.v1.PersistentVolumeSpecArgs(
+                storage_class_name=args.storage_class_name,
+                capacity={"storage": "{}Gi".format(args.filestore.capacity_gb)},
+                access_modes=["ReadWriteMany"],
+                persistent_volume_reclaim_policy="Retain",
+                csi=k8s.core.v1.CSIPersistentVolumeSourceArgs(
+                    driver="filestore.csi.storage.gke.io",
+                    volume_handle=instance.name.apply(
+                        lambda instance_name: "modeInstance/{}/{}/{}".format(
+                            args.filestore.location, instance_name, args.filestore.share_name)),
+                    volume_attributes={
+                        "ip": instance.networks[0].ip_addresses[0],
+                        "volume": args.filestore.share_name,
+                    }),
+                claim_ref=k8s.core.v1.ObjectReferenceArgs(
+                    namespace=args.namespace,
+                    name=args.claim_name) if args.claim_name else None),
+            opts=ResourceOptions.merge(child_opts, ResourceOptions(depends_on=[self.storage_class])))
+
+        self.persistent_volume_claim = None
+        if args.claim_name:
+            self.persistent_volume_claim = k8s.core.v1.PersistentVolumeClaim(
+                resource_name=name,
+                metadata=k8s.meta.v1.ObjectMetaArgs(name=args.claim_name, namespace=args.namespace),
+                spec=k8s.core.v1.PersistentVolumeClaimSpecArgs(
+                    storage_class_name=args.storage_class_name,
+                    access_modes=["ReadWriteMany"],
+                    volume_name=self.persistent_volume.metadata.name,
+                    resources=k8s.core.v1.VolumeResourceRequirementsArgs(
+                        requests={"storage": "{}Gi".format(args.filestore.capacity_gb)})),
+                opts=child_opts)
+        self.register_outputs({})
@@ -1,3 +1,4 @@
+from typing import Sequence
 from pulumi import ComponentResource, ResourceOptions
 from pulumi_gcp import artifactregistry
 
@@ -5,10 +6,12 @@ class ArtifactRegistryArgs:
     def __init__(self,
                  repository_id: str,
                  location: str,
-                 format):
+                 format,
+                 cleanup_policies: Sequence[artifactregistry.RepositoryCleanupPolicyArgs]=None):
         self.repository_id = repository_id
         self.location = location
         self.format = format
+        self.cleanup_policies = cleanup_policies
 
 # https://www.pulumi.com/registry/packages/gcp/api-docs/artifactregistry/repository/
 class ArtifactRegistry(ComponentResource):
@@ -24,5 +27,6 @@ class ArtifactRegistry(ComponentResource):
             location=args.location,
             repository_id=args.repository_id,
             format=args.format,
+            cleanup_policies=args.cleanup_policies,
             opts=ResourceOptions(parent=self))
         self.register_outputs({})
\ No newline at end of file
@@ -59,4 +59,121 @@ class StorageBucketAcl(ComponentResource):
             bucket=args.bucket.name,
             role_entities=args.role_entity,
             opts=ResourceOptions(parent=self))
-        self.register_outputs({})
\ No newline at end of file
+        self.register_outputs({})
+
+class FuseCacheArgs:
+    def __init__(self,
+                 file_cache_size_mb: int=0,
+                 cache_file_for_range_read=False,
+                 metadata_cache_ttl_secs: int=60,
+                 stat_cache_size_mb: int=32,
+                 type_cache_size_mb: int=4,
+                 parallel_downloads=False,
+                 parallel_downloads_per_file: int=16,
+                 max_parallel_downloads: int=-1,
+                 download_chunk_size_mb: int=50,
+                 read_ahead_kb: int=None,
+                 ) -> None:
+        # file_cache_size_mb=0 disables the file cache, -1 lets it use the whole sidecar volume
+        self.file_cache_size_mb = file_cache_size_mb
+        self.cache_file_for_range_read = cache_file_for_range_read
+        self.metadata_cache_ttl_secs = metadata_cache_ttl_secs
+        self.stat_cache_size_mb = stat_cache_size_mb
+        self.type_cache_size_mb = type_cache_size_mb
+        self.parallel_downloads = parallel_downloads
+        self.parallel_downloads_per_file = parallel_downloads_per_file
+        self.max_parallel_downloads = max_parallel_downloads
+        self.download_chunk_size_mb = download_chunk_size_mb
+        self.read_ahead_kb = read_ahead_kb
+
+class StorageBucketFuseMountArgs:
+    def __init__(self,
+                 bucket: storage.Bucket,
+                 project_id: str,
+                 namespace: str,
+                 kubernetes_service_account: str,
+                 volume_name: str,
+                 mount_path: str,
+                 read_only=True,
+                 cache: FuseCacheArgs=None,
+                 sidecar_ephemeral_storage_limit: str=None,
+                 sidecar_memory_limit: str=None,
+                 ) -> None:
+        self.bucket = bucket
+        self.project_id = project_id
+        self.namespace = namespace
+        self.kubernetes_service_account = kubernetes_service_account
+        self.volume_name = volume_name
+        self.mount_path = mount_path
+        self.read_only = read_only
+        self.cache = cache or FuseCacheArgs()
+        self.sidecar_ephemeral_storage_limit = sidecar_ephemeral_storage_limit
+        self.sidecar_memory_limit = sidecar_memory_limit
+
+# Mounts a bucket into pods with the Cloud Storage FUSE CSI driver (the cluster needs
+# addons_config.gcs_fuse_csi_driver_config enabled and GKE_METADATA on the node pool).
+# Grants the Kubernetes service account access through workload identity and exposes
+# the pod annotations, volume and volume mount to paste into a workload spec.
+# https://cloud.google.com/kubernetes-engine/docs/how-to/persistent-volumes/cloud-storage-fuse-csi-driver-perf
+class StorageBucketFuseMount(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: StorageBucketFuseMountArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+
+        member = "serviceAccount:{}.svc.id.goog[{}/{}]".format(
+            args.project_id, args.namespace, args.kubernetes_service_account)
+        self.bucket_iam_member = storage.BucketIAMMember(
+            resource_name=name,
+            bucket=args.bucket.name,
+            role="roles/storage.objectViewer" if args.read_only else "roles/storage.objectUser",
+            member=member,
+            opts=ResourceOptions(parent=self))
+
+        self.pod_annotations = {"gke-gcsfuse/volumes": "true"}
+        if args.sidecar_ephemeral_storage_limit:
+            # the file cache lives on the sidecar's ephemeral storage
+            self.pod_annotations["gke-gcsfuse/ephemeral-storage-limit"] = args.sidecar_ephemeral_storage_limit
+        if args.sidecar_memory_limit:
+            self.pod_annotations["gke-gcsfuse/memory-limit"] = args.sidecar_memory_limit
+
+        self.volume = {
+            "name": args.volume_name,
+            "csi": {
+                "driver": "gcsfuse.csi.storage.gke.io",
+                "readOnly": args.read_only,
+                "volumeAttributes": args.bucket.name.apply(
+                    lambda bucket_name: fuse_volume_attributes(bucket_name, args.cache)),
+            },
+        }
+        self.volume_mount = {
+            "name": args.volume_name,
+            "mountPath": args.mount_path,
+            "readOnly": args.read_only,
+        }
+        self.register_outputs({})
+
+def fuse_volume_attributes(bucket_name: str, cache: FuseCacheArgs) -> dict:
+    mount_options = ["implicit-dirs"]
+    if cache.parallel_downloads:
+        mount_options += [
+            "file-cache:enable-parallel-downloads:true",
+            "file-cache:parallel-downloads-per-file:{}".format(cache.parallel_downloads_per_file),
+            "file-cache:max-parallel-downloads:{}".format(cache.max_parallel_downloads),
+            "file-cache:download-chunk-size-mb:{}".format(cache.download_chunk_size_mb),
+        ]
+    if cache.read_ahead_kb is not None:
+        mount_options.append("read_ahead_kb={}".format(cache.read_ahead_kb))
+
+    # CSI volume attributes are all strings
+    return {
+        "bucketName": bucket_name,
+        "mountOptions": ",".join(mount_options),
+        "fileCacheCapacity": "-1" if cache.file_cache_size_mb < 0 else "{}Mi".format(cache.file_cache_size_mb),
+        "fileCacheForRangeRead": str(cache.cache_file_for_range_read).lower(),
+        "metadataCacheTTLSeconds": str(cache.metadata_cache_ttl_secs),
+        "metadataStatCacheCapacity": "{}Mi".format(cache.stat_cache_size_mb),
+        "metadataTypeCacheCapacity": "{}Mi".format(cache.type_cache_size_mb),
+    }
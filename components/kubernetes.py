@@ -1,4 +1,5 @@
-from pulumi import ComponentResource, ResourceOptions
+from pulumi import ComponentResource, Output, ResourceOptions
+import pulumi_kubernetes as k8s
 from pulumi_gcp import compute, container
 from components.variables import region
 
@@ -19,6 +20,8 @@ class KubernetesClusterArgs:
                  monitoring_service=None,
                  networking_mode="VPC_NATIVE",
                  deletion_protection=False,
+                 gateway_api_config: container.ClusterGatewayApiConfigArgs=None,
+                 maintenance_policy: container.ClusterMaintenancePolicyArgs=None,
                  depends_on=None
                  ):
         self.name = name
@@ -36,6 +39,8 @@ class KubernetesClusterArgs:
         self.monitoring_service = monitoring_service
         self.networking_mode = networking_mode
         self.deletion_protection = deletion_protection
+        self.gateway_api_config = gateway_api_config
+        self.maintenance_policy = maintenance_policy
         self.depends_on = depends_on
 
 # https://www.pulumi.com/registry/packages/gcp/api-docs/container/cluster/
@@ -63,6 +68,61 @@ class KubernetesCluster(ComponentResource):
             monitoring_service=None,
             networking_mode="VPC_NATIVE",
             deletion_protection=False,
+            gateway_api_config=args.gateway_api_config,
+            maintenance_policy=args.maintenance_policy,
             opts=ResourceOptions(parent=self, depends_on=args.depends_on))
         
-        self.register_outputs({})
\ No newline at end of file
+        self.register_outputs({})
+
+class KubernetesProviderArgs:
+    def __init__(self,
+                 cluster: container.Cluster,
+                 ):
+        self.cluster = cluster
+
+def kubeconfig(name: str, endpoint: str, ca_certificate: str) -> str:
+    return """apiVersion: v1
+kind: Config
+clusters:
+- cluster:
+    certificate-authority-data: {ca_certificate}
+    server: https://{endpoint}
+  name: {name}
+contexts:
+- context:
+    cluster: {name}
+    user: {name}
+  name: {name}
+current-context: {name}
+users:
+- name: {name}
+  user:
+    exec:
+      apiVersion: client.authentication.k8s.io/v1beta1
+      command: gke-gcloud-auth-plugin
+      installHint: Install gke-gcloud-auth-plugin for use with kubectl by following
+        https://cloud.google.com/kubernetes-engine/docs/how-to/cluster-access-for-kubectl#install_plugin
+      provideClusterInfo: true
+""".format(name=name, endpoint=endpoint, ca_certificate=ca_certificate)
+
+# Kubernetes provider talking to the GKE cluster, pass it as `provider` to Kubernetes resources
+# https://www.pulumi.com/registry/packages/kubernetes/api-docs/provider/
+class KubernetesProvider(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: KubernetesProviderArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+
+        self.kubeconfig = Output.all(
+            args.cluster.name,
+            args.cluster.endpoint,
+            args.cluster.master_auth.cluster_ca_certificate
+        ).apply(lambda values: kubeconfig(*values))
+
+        self.provider = k8s.Provider(
+            resource_name=name,
+            kubeconfig=self.kubeconfig,
+            opts=ResourceOptions(parent=self))
+        self.register_outputs({})
@@ -0,0 +1,199 @@
+from typing import Mapping, Sequence
+from pulumi import ComponentResource, ResourceOptions
+from pulumi_gcp import compute
+import pulumi_kubernetes as k8s
+from components.firewall import Firewall, FirewallArgs
+
+# Google front ends and health checkers connect to the pods from these ranges
+# https://cloud.google.com/load-balancing/docs/health-check-concepts#ip-ranges
+GFE_SOURCE_RANGES = ["35.191.0.0/16", "130.211.0.0/22"]
+
+# Service appProtocol per backend protocol, h2c is cleartext HTTP/2 to the pods
+APP_PROTOCOLS = {
+    "HTTP": "HTTP",
+    "HTTP2": "kubernetes.io/h2c",
+}
+
+class HealthCheckArgs:
+    def __init__(self,
+                 request_path: str="/healthz",
+                 port: int=None,
+                 check_interval_sec: int=5,
+                 timeout_sec: int=5,
+                 healthy_threshold: int=2,
+                 unhealthy_threshold: int=2,
+                 ):
+        self.request_path = request_path
+        self.port = port
+        self.check_interval_sec = check_interval_sec
+        self.timeout_sec = timeout_sec
+        self.healthy_threshold = healthy_threshold
+        self.unhealthy_threshold = unhealthy_threshold
+
+class LoadBalancerArgs:
+    def __init__(self,
+                 name: str,
+                 namespace: str,
+                 provider: k8s.Provider,
+                 network: compute.Network,
+                 selector: Mapping[str, str],
+                 port: int=80,
+                 target_port: int=8080,
+                 protocol="HTTP",
+                 hostnames: Sequence[str]=None,
+                 health_check: HealthCheckArgs=None,
+                 backend_timeout_sec: int=30,
+                 connection_draining_timeout_sec: int=30,
+                 session_affinity: str=None,
+                 session_affinity_cookie_ttl_sec: int=None,
+                 gateway_class="gke-l7-global-external-managed",
+                 target_tags: Sequence[str]=["http-server"],
+                 security_policy: compute.SecurityPolicy=None,
+                 depends_on=None
+                 ):
+        if protocol not in APP_PROTOCOLS:
+            raise ValueError("protocol must be one of " + ", ".join(APP_PROTOCOLS))
+        self.name = name
+        self.namespace = namespace
+        self.provider = provider
+        self.network = network
+        self.selector = selector
+        self.port = port
+        self.target_port = target_port
+        self.protocol = protocol
+        self.hostnames = hostnames
+        self.health_check = health_check or HealthCheckArgs()
+        self.backend_timeout_sec = backend_timeout_sec
+        self.connection_draining_timeout_sec = connection_draining_timeout_sec
+        # None, CLIENT_IP or GENERATED_COOKIE
+        self.session_affinity = session_affinity
+        self.session_affinity_cookie_ttl_sec = session_affinity_cookie_ttl_sec
+        self.gateway_class = gateway_class
+        self.target_tags = target_tags
+        self.security_policy = security_policy
+        self.depends_on = depends_on
+
+# Publishes pods through a GKE Gateway whose backends are NEGs, so the load balancer
+# sends traffic straight to pod IPs instead of NodePort + kube-proxy. The gateway controller
+# creates the NEGs for the HTTPRoute's Service itself, the Service needs no neg annotation.
+# Needs http_load_balancing and gateway_api_config enabled on the cluster.
+# https://cloud.google.com/kubernetes-engine/docs/how-to/deploying-gateways
+# https://cloud.google.com/kubernetes-engine/docs/how-to/configure-gateway-resources
+class LoadBalancer(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: LoadBalancerArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+        child_opts = ResourceOptions(parent=self, provider=args.provider, depends_on=args.depends_on)
+
+        def metadata(suffix=""):
+            return k8s.meta.v1.ObjectMetaArgs(name=args.name + suffix, namespace=args.namespace)
+
+        # health checks and proxied traffic hit the pods on the nodes tagged http-server
+        self.firewall = Firewall(
+            name + "-gfe",
+            label + ":firewall",
+            FirewallArgs(
+                name=name + "-gfe",
+                network=args.network,
+                source_ranges=GFE_SOURCE_RANGES,
+                target_tags=args.target_tags,
+                allows=[compute.FirewallAllowArgs(
+                    protocol="tcp",
+                    ports=sorted({str(args.target_port), str(args.health_check.port or args.target_port)})
+                )]),
+            opts=ResourceOptions(parent=self))
+
+        self.address = compute.GlobalAddress(
+            resource_name=name,
+            opts=ResourceOptions(parent=self))
+
+        self.service = k8s.core.v1.Service(
+            resource_name=name,
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=args.name,
+                namespace=args.namespace),
+            spec=k8s.core.v1.ServiceSpecArgs(
+                type="ClusterIP",
+                selector=args.selector,
+                ports=[k8s.core.v1.ServicePortArgs(
+                    port=args.port,
+                    target_port=args.target_port,
+                    protocol="TCP",
+                    app_protocol=APP_PROTOCOLS[args.protocol])]),
+            opts=child_opts)
+
+        service_ref = {"group": "", "kind": "Service", "name": args.name}
+
+        health_check_config = {"port": args.health_check.port or args.target_port,
+                               "requestPath": args.health_check.request_path}
+        self.health_check_policy = k8s.apiextensions.CustomResource(
+            resource_name=name + "-healthcheck",
+            api_version="networking.gke.io/v1",
+            kind="HealthCheckPolicy",
+            metadata=metadata("-healthcheck"),
+            spec={
+                "default": {
+                    "checkIntervalSec": args.health_check.check_interval_sec,
+                    "timeoutSec": args.health_check.timeout_sec,
+                    "healthyThreshold": args.health_check.healthy_threshold,
+                    "unhealthyThreshold": args.health_check.unhealthy_threshold,
+                    "config": {
+                        "type": args.protocol,
+                        "httpHealthCheck" if args.protocol == "HTTP" else "http2HealthCheck": health_check_config,
+                    },
+                },
+                "targetRef": service_ref,
+            },
+            opts=child_opts)
+
+        backend = {
+            "timeoutSec": args.backend_timeout_sec,
+            "connectionDraining": {"drainingTimeoutSec": args.connection_draining_timeout_sec},
+        }
+        if args.session_affinity:
+            backend["sessionAffinity"] = {"type": args.session_affinity}
+            if args.session_affinity_cookie_ttl_sec is not None:
+                backend["sessionAffinity"]["cookieTtlSec"] = args.session_affinity_cookie_ttl_sec
+        if args.security_policy is not None:
+            # Cloud Armor on the backend service the gateway creates for this Service
+            backend["securityPolicy"] = args.security_policy.name
+        self.backend_policy = k8s.apiextensions.CustomResource(
+            resource_name=name + "-backend",
+            api_version="networking.gke.io/v1",
+            kind="GCPBackendPolicy",
+            metadata=metadata("-backend"),
+            spec={
+                "default": backend,
+                "targetRef": service_ref,
+            },
+            opts=child_opts)
+
+        self.gateway = k8s.apiextensions.CustomResource(
+            resource_name=name,
+            api_version="gateway.networking.k8s.io/v1",
+            kind="Gateway",
+            metadata=metadata(),
+            spec={
+                "gatewayClassName": args.gateway_class,
+                "listeners": [{"name": "http", "protocol": "HTTP", "port": 80}],
+                "addresses": [{"type": "NamedAddress", "value": self.address.name}],
+            },
+            opts=child_opts)
+
+        route_spec = {
+            "parentRefs": [{"kind": "Gateway", "name": args.name}],
+            "rules": [{"backendRefs": [{"name": args.name, "port": args.port}]}],
+        }
+        if args.hostnames:
+            route_spec["hostnames"] = args.hostnames
+        self.route = k8s.apiextensions.CustomResource(
+            resource_name=name,
+            api_version="gateway.networking.k8s.io/v1",
+            kind="HTTPRoute",
+            metadata=metadata(),
+            spec=route_spec,
+            opts=ResourceOptions.merge(child_opts, ResourceOptions(depends_on=[self.gateway, self.service])))
+        self.register_outputs({})
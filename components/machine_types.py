@@ -0,0 +1,72 @@
+import re
+
+class MachineType:
+    def __init__(self,
+                 name: str,
+                 vcpus: float,
+                 memory_gb: float):
+        self.name = name
+        self.vcpus = vcpus
+        self.memory_gb = memory_gb
+
+# Shared-core types don't follow the family-N naming
+# https://cloud.google.com/compute/docs/general-purpose-machines
+SHARED_CORE = {
+    "e2-micro": MachineType("e2-micro", 2, 1),
+    "e2-small": MachineType("e2-small", 2, 2),
+    "e2-medium": MachineType("e2-medium", 2, 4),
+    "f1-micro": MachineType("f1-micro", 1, 0.6),
+    "g1-small": MachineType("g1-small", 1, 1.7),
+}
+
+# GB of memory per vCPU for the predefined shapes
+MEMORY_PER_VCPU = {
+    "standard": 4,
+    "highmem": 8,
+    "highcpu": 1,
+}
+# families that deviate from the table above
+FAMILY_MEMORY_PER_VCPU = {
+    ("n1", "standard"): 3.75,
+    ("n1", "highmem"): 6.5,
+    ("n1", "highcpu"): 0.9,
+    ("c2", "standard"): 4,
+    ("c3", "highcpu"): 2,
+}
+
+def machine_type(name: str) -> MachineType:
+    if name in SHARED_CORE:
+        return SHARED_CORE[name]
+    custom = re.fullmatch(r"(?:([a-z0-9]+)-)?custom-(\d+)-(\d+)(?:-ext)?", name)
+    if custom:
+        return MachineType(name, int(custom.group(2)), int(custom.group(3)) / 1024)
+    predefined = re.fullmatch(r"([a-z0-9]+)-(standard|highmem|highcpu)-(\d+)", name)
+    if predefined:
+        family, shape, vcpus = predefined.group(1), predefined.group(2), int(predefined.group(3))
+        per_vcpu = FAMILY_MEMORY_PER_VCPU.get((family, shape), MEMORY_PER_VCPU[shape])
+        return MachineType(name, vcpus, vcpus * per_vcpu)
+    raise ValueError("unknown machine type " + name)
+
+def allocatable(machine: MachineType):
+    """CPU (cores) and memory (GB) left for pods on a GKE node after kube/system reservations.
+    https://cloud.google.com/kubernetes-engine/docs/concepts/plan-node-sizes#memory_and_cpu_reservations"""
+    # shared-core e2 nodes get a flat allocatable CPU
+    cpu_reserved = 1.06 if machine.name in ("e2-micro", "e2-small", "e2-medium") else _tiered(
+        machine.vcpus, [(1, 0.06), (1, 0.01), (2, 0.005), (None, 0.0025)])
+    if machine.memory_gb < 1:
+        memory_reserved = 0.255
+    else:
+        memory_reserved = _tiered(machine.memory_gb, [(4, 0.25), (4, 0.2), (8, 0.1), (112, 0.06), (None, 0.02)])
+    eviction_threshold = 0.1
+    return (max(0, machine.vcpus - cpu_reserved),
+            max(0, machine.memory_gb - memory_reserved - eviction_threshold))
+
+def _tiered(amount: float, tiers) -> float:
+    reserved = 0
+    for size, rate in tiers:
+        portion = amount if size is None else min(amount, size)
+        reserved += portion * rate
+        amount -= portion
+        if amount <= 0:
+            break
+    return reserved
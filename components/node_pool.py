@@ -1,7 +1,22 @@
 from typing import Sequence
-from pulumi import ComponentResource, ResourceOptions
+from pulumi import ComponentResource, ResourceOptions, Output
 from pulumi_gcp import container
-from components.variables import zone
+from components.scaling import ScalingWindowArgs, validate_windows, scaling_jobs
+from components.variables import region, zone, project_id
+
+class NodePoolScalingWindowArgs(ScalingWindowArgs):
+    def __init__(self,
+                 name: str,
+                 start: str,
+                 end: str,
+                 min_node_count: int,
+                 max_node_count: int,
+                 time_zone: str="Etc/UTC",
+                 ):
+        super().__init__(name, start, end, time_zone)
+        # autoscaling bounds during the window, the pool's autoscaling bounds are restored at the end
+        self.min_node_count = min_node_count
+        self.max_node_count = max_node_count
 
 class NodePoolArgs:
     def __init__(self,
@@ -12,6 +27,9 @@ class NodePoolArgs:
                  management=container.NodePoolManagementArgs,
                  node_count=1,
                  node_locations: Sequence[str]=[zone],
+                 upgrade_settings: container.NodePoolUpgradeSettingsArgs=None,
+                 scaling_windows: Sequence[NodePoolScalingWindowArgs]=None,
+                 scaling_service_account=None,
                  depends_on=None
                 ):
         self.name = name
@@ -21,8 +39,39 @@ class NodePoolArgs:
         self.node_locations = node_locations
         self.autoscaling = autoscaling
         self.management = management
+        self.upgrade_settings = upgrade_settings
+        # scheduled autoscaling bounds, applied by Cloud Scheduler jobs running as
+        # scaling_service_account (email, needs roles/container.clusterAdmin)
+        self.scaling_windows = scaling_windows or []
+        self.scaling_service_account = scaling_service_account
         self.depends_on = depends_on
 
+# Upgrade strategies for NodePoolArgs.upgrade_settings
+# https://cloud.google.com/kubernetes-engine/docs/concepts/node-pool-upgrade-strategies
+
+# Surge: bring up max_surge new nodes before draining old ones,
+# max_unavailable=0 means the pool never drops below its current size
+def surge_upgrade(max_surge: int=1, max_unavailable: int=0) -> container.NodePoolUpgradeSettingsArgs:
+    return container.NodePoolUpgradeSettingsArgs(
+        strategy="SURGE",
+        max_surge=max_surge,
+        max_unavailable=max_unavailable)
+
+# Blue-green: create a full green pool, drain blue in batches with a soak between each,
+# and keep blue around for node_pool_soak_duration so a bad upgrade can be rolled back
+def blue_green_upgrade(node_pool_soak_duration: str="3600s",
+                       batch_percentage: float=None,
+                       batch_node_count: int=1,
+                       batch_soak_duration: str="300s") -> container.NodePoolUpgradeSettingsArgs:
+    return container.NodePoolUpgradeSettingsArgs(
+        strategy="BLUE_GREEN",
+        blue_green_settings=container.NodePoolUpgradeSettingsBlueGreenSettingsArgs(
+            node_pool_soak_duration=node_pool_soak_duration,
+            standard_rollout_policy=container.NodePoolUpgradeSettingsBlueGreenSettingsStandardRolloutPolicyArgs(
+                batch_percentage=batch_percentage,
+                batch_node_count=None if batch_percentage is not None else batch_node_count,
+                batch_soak_duration=batch_soak_duration)))
+
 # https://www.pulumi.com/registry/packages/gcp/api-docs/container/nodepool/
 class NodePool(ComponentResource):
     def __init__(self, 
@@ -30,8 +79,16 @@ class NodePool(ComponentResource):
                  label: str,
                  args: NodePoolArgs, 
                  opts: ResourceOptions = None):
+        # before anything is registered, a bad schedule must not leave a half created pool
+        if args.scaling_windows:
+            validate_windows(args.scaling_windows)
         super().__init__(label, name, {}, opts)
 
+        # kept for sizing things off the pool (headroom, capacity reports)
+        self.node_config = args.node_config
+        self.autoscaling = args.autoscaling
+        self.node_count = args.node_count
+
         self.node_pool = container.NodePool(
             resource_name=args.name,
             cluster=args.cluster.id,
@@ -40,7 +97,35 @@ class NodePool(ComponentResource):
             node_locations=args.node_locations,
             autoscaling=args.autoscaling,
             management=args.management,
-            opts=ResourceOptions(parent=self, depends_on=args.depends_on)
+            upgrade_settings=args.upgrade_settings,
+            # the scheduler jobs own the bounds while scaling windows are set
+            opts=ResourceOptions(parent=self, depends_on=args.depends_on,
+                                 ignore_changes=["autoscaling.minNodeCount", "autoscaling.maxNodeCount"]
+                                 if args.scaling_windows else None)
         )
 
+        self.scaling_jobs = []
+        if args.scaling_windows:
+            # https://cloud.google.com/kubernetes-engine/docs/reference/rest/v1/projects.locations.clusters.nodePools/setAutoscaling
+            uri = Output.concat("https://container.googleapis.com/v1/projects/", project_id,
+                                "/locations/", args.cluster.location,
+                                "/clusters/", args.cluster.name,
+                                "/nodePools/", self.node_pool.name, ":setAutoscaling")
+
+            def autoscaling(min_node_count, max_node_count):
+                return {"autoscaling": {
+                    "enabled": True,
+                    "minNodeCount": min_node_count,
+                    "maxNodeCount": max_node_count,
+                    "locationPolicy": args.autoscaling.location_policy or "BALANCED"}}
+
+            for window in args.scaling_windows:
+                self.scaling_jobs.extend(scaling_jobs(
+                    name, window, uri, "POST",
+                    apply_body=autoscaling(window.min_node_count, window.max_node_count),
+                    revert_body=autoscaling(args.autoscaling.min_node_count, args.autoscaling.max_node_count),
+                    service_account_email=args.scaling_service_account,
+                    opts=ResourceOptions(parent=self),
+                    region=region))
+
         self.register_outputs({})
\ No newline at end of file
@@ -0,0 +1,106 @@
+import math
+from pulumi import ComponentResource, ResourceOptions
+import pulumi_kubernetes as k8s
+from components.machine_types import machine_type, allocatable
+from components.node_pool import NodePool
+
+class HeadroomSize:
+    def __init__(self,
+                 replicas: int,
+                 cpu_millis: int,
+                 memory_mib: int):
+        self.replicas = replicas
+        self.cpu_millis = cpu_millis
+        self.memory_mib = memory_mib
+
+def headroom_size(machine: str, max_node_count: int, fraction: float, pod_fraction_of_node: float) -> HeadroomSize:
+    """Splits `fraction` of the pool's max allocatable capacity evenly into the fewest
+    placeholder pods of at most `pod_fraction_of_node` of a node each."""
+    if not 0 < fraction < 1:
+        raise ValueError("headroom fraction must be between 0 and 1")
+    if not 0 < pod_fraction_of_node <= 1:
+        raise ValueError("pod_fraction_of_node must be in (0, 1]")
+    cpu, memory_gb = allocatable(machine_type(machine))
+    total_cpu = cpu * max_node_count * fraction
+    total_memory_gb = memory_gb * max_node_count * fraction
+    # a placeholder must fit next to the system pods, keep 10% of the node free
+    max_pod_cpu = cpu * pod_fraction_of_node * 0.9
+    max_pod_memory_gb = memory_gb * pod_fraction_of_node * 0.9
+    replicas = max(1, math.ceil(total_cpu / max_pod_cpu)) if max_pod_cpu > 0 else 1
+    # split the headroom evenly so the replicas add up to `fraction`, not a rounded up multiple
+    pod_cpu = min(total_cpu / replicas, max_pod_cpu)
+    pod_memory_gb = min(total_memory_gb / replicas, max_pod_memory_gb)
+    return HeadroomSize(replicas, max(1, int(pod_cpu * 1000)), max(1, int(pod_memory_gb * 1024)))
+
+class OverprovisioningArgs:
+    def __init__(self,
+                 node_pool: NodePool,
+                 provider: k8s.Provider,
+                 namespace: str="kube-system",
+                 fraction: float=0.2,
+                 pod_fraction_of_node: float=0.5,
+                 # the cluster autoscaler ignores pods below -10 (expendable-pods-priority-cutoff),
+                 # placeholders must stay at or above it to trigger scale-up
+                 priority: int=-10,
+                 image="registry.k8s.io/pause:3.9",
+                 ):
+        self.node_pool = node_pool
+        self.provider = provider
+        self.namespace = namespace
+        self.fraction = fraction
+        self.pod_fraction_of_node = pod_fraction_of_node
+        self.priority = priority
+        self.image = image
+
+# Keeps spare capacity warm with low-priority pause pods. Real pods preempt them right
+# away, the evicted placeholders go pending and the cluster autoscaler adds a node for
+# them in the background, so bursts don't wait for a node to boot.
+# https://cloud.google.com/kubernetes-engine/docs/how-to/capacity-provisioning
+class Overprovisioning(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: OverprovisioningArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+        child_opts = ResourceOptions(parent=self, provider=args.provider)
+
+        node_pool = args.node_pool
+        self.size = headroom_size(
+            node_pool.node_config.machine_type,
+            node_pool.autoscaling.max_node_count,
+            args.fraction,
+            args.pod_fraction_of_node)
+
+        self.priority_class = k8s.scheduling.v1.PriorityClass(
+            resource_name=name,
+            metadata=k8s.meta.v1.ObjectMetaArgs(name=name),
+            value=args.priority,
+            global_default=False,
+            # placeholders must never evict anything themselves
+            preemption_policy="Never",
+            description="Placeholder pods keeping headroom on the node pool, preempted by any real workload",
+            opts=child_opts)
+
+        labels = {"app": name}
+        resources = {"cpu": "{}m".format(self.size.cpu_millis), "memory": "{}Mi".format(self.size.memory_mib)}
+        self.deployment = k8s.apps.v1.Deployment(
+            resource_name=name,
+            metadata=k8s.meta.v1.ObjectMetaArgs(name=name, namespace=args.namespace),
+            spec=k8s.apps.v1.DeploymentSpecArgs(
+                replicas=self.size.replicas,
+                selector=k8s.meta.v1.LabelSelectorArgs(match_labels=labels),
+                template=k8s.core.v1.PodTemplateSpecArgs(
+                    metadata=k8s.meta.v1.ObjectMetaArgs(labels=labels),
+                    spec=k8s.core.v1.PodSpecArgs(
+                        priority_class_name=self.priority_class.metadata.name,
+                        termination_grace_period_seconds=0,
+                        node_selector={"cloud.google.com/gke-nodepool": node_pool.node_pool.name},
+                        containers=[k8s.core.v1.ContainerArgs(
+                            name="pause",
+                            image=args.image,
+                            resources=k8s.core.v1.ResourceRequirementsArgs(
+                                requests=resources,
+                                limits=resources))]))),
+            opts=child_opts)
+        self.register_outputs({})
@@ -0,0 +1,134 @@
+import atexit
+import functools
+import os
+import time
+import tracemalloc
+import pulumi
+
+# Set to a report path to profile a run: PULUMI_PROFILE_COMPONENTS=profile.txt pulumi preview
+PROFILE_ENV = "PULUMI_PROFILE_COMPONENTS"
+
+class ComponentProfile:
+    __slots__ = ("type", "name", "wall", "self_wall", "size", "peak", "outputs", "applies")
+
+    def __init__(self, type_: str, name: str):
+        self.type = type_
+        self.name = name
+        # seconds in the constructor, and without the components it created
+        self.wall = 0
+        self.self_wall = 0
+        # bytes still allocated when the constructor returns, and the high-water mark above
+        # what was allocated when it started
+        self.size = 0
+        self.peak = 0
+        # Outputs created and .apply() calls made by the constructor itself
+        self.outputs = 0
+        self.applies = 0
+
+class _Frame:
+    __slots__ = ("profile", "child_wall", "outputs", "applies", "start_size", "peak")
+
+    def __init__(self, profile: ComponentProfile, start_size: int):
+        self.profile = profile
+        self.child_wall = 0
+        self.outputs = 0
+        self.applies = 0
+        self.start_size = start_size
+        # absolute traced memory high-water mark seen so far, tracemalloc's peak is reset per frame
+        self.peak = start_size
+
+class _Profiler:
+    def __init__(self, path: str):
+        self.path = path
+        self.profiles = []
+        # constructors in progress, innermost last
+        self.stack = []
+        # Outputs and applies made by the program outside of any constructor
+        self.program = ComponentProfile("<program>", "<program>")
+
+    def wrap(self, init):
+        @functools.wraps(init)
+        def wrapper(component, name, *args, **kwargs):
+            profile = ComponentProfile(type(component).__module__ + "." + type(component).__name__, name)
+            size, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1].peak = max(self.stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            frame = _Frame(profile, size)
+            self.stack.append(frame)
+            start = time.perf_counter()
+            try:
+                return init(component, name, *args, **kwargs)
+            finally:
+                profile.wall = time.perf_counter() - start
+                size, peak = tracemalloc.get_traced_memory()
+                self.stack.pop()
+                frame.peak = max(frame.peak, peak)
+                profile.size = size - frame.start_size
+                profile.peak = frame.peak - frame.start_size
+                profile.self_wall = profile.wall - frame.child_wall
+                profile.outputs = frame.outputs
+                profile.applies = frame.applies
+                if self.stack:
+                    self.stack[-1].child_wall += profile.wall
+                    self.stack[-1].peak = max(self.stack[-1].peak, frame.peak)
+                tracemalloc.reset_peak()
+                self.profiles.append(profile)
+        return wrapper
+
+    def report(self):
+        lines = [
+            "component constructors by self time, wall includes the components they create",
+            "%-60s %9s %9s %10s %10s %8s %8s" % ("component", "wall ms", "self ms", "net KiB", "peak KiB", "outputs", "applies"),
+        ]
+        for profile in sorted(self.profiles, key=lambda p: p.self_wall, reverse=True):
+            lines.append("%-60s %9.2f %9.2f %10.1f %10.1f %8d %8d" % (
+                profile.name + " (" + profile.type.rsplit(".", 1)[-1] + ")",
+                profile.wall * 1000, profile.self_wall * 1000, profile.size / 1024,
+                profile.peak / 1024, profile.outputs, profile.applies))
+        lines.append("%-60s %9s %9s %10s %10s %8d %8d" % (
+            "<program> (outside constructors)", "-", "-", "-", "-", self.program.outputs, self.program.applies))
+        lines.append("%d components, %.2f ms in constructors" % (
+            len(self.profiles), sum(p.self_wall for p in self.profiles) * 1000))
+        with open(self.path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+def _component_classes(cls=pulumi.ComponentResource):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _component_classes(subclass)
+
+def register_profiling(path: str=None):
+    """Opt-in constructor profiling. Call after the components are imported, before any is created.
+    path (e.g. from stack config) or $PULUMI_PROFILE_COMPONENTS is where the report is written
+    when the program exits; nothing happens when neither is set."""
+    path = path or os.environ.get(PROFILE_ENV)
+    if not path:
+        return None
+    profiler = _Profiler(path)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    # apply, all and concat build their Outputs with object.__new__ and skip __init__, both
+    # paths register the new Output through _track
+    output_track = pulumi.Output._track
+    output_apply = pulumi.Output.apply
+
+    def counted_track(output, *args, **kwargs):
+        (profiler.stack[-1] if profiler.stack else profiler.program).outputs += 1
+        return output_track(output, *args, **kwargs)
+
+    def counted_apply(output, *args, **kwargs):
+        (profiler.stack[-1] if profiler.stack else profiler.program).applies += 1
+        return output_apply(output, *args, **kwargs)
+
+    pulumi.Output._track = counted_track
+    pulumi.Output.apply = counted_apply
+
+    for cls in set(_component_classes()):
+        # only our own constructors, inherited ones are wrapped on the class defining them
+        if cls.__module__.startswith("components.") and "__init__" in cls.__dict__:
+            cls.__init__ = profiler.wrap(cls.__init__)
+
+    atexit.register(profiler.report)
+    return profiler
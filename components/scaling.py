@@ -0,0 +1,123 @@
+import base64
+import json
+from typing import Sequence
+from pulumi import ResourceOptions
+from pulumi_gcp import cloudscheduler
+from components.variables import region
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+class ScalingWindowArgs:
+    def __init__(self,
+                 name: str,
+                 start: str,
+                 end: str,
+                 time_zone: str="Etc/UTC",
+                 ):
+        self.name = name
+        # cron "minute hour * * day-of-week" the scaled up settings are applied at
+        self.start = start
+        # cron the base settings are restored at
+        self.end = end
+        self.time_zone = time_zone
+
+def _cron_field(field: str, low: int, high: int):
+    values = set()
+    for part in field.split(","):
+        value_range, _, step = part.partition("/")
+        if value_range == "*":
+            first, last = low, high
+        elif "-" in value_range:
+            first, last = (int(v) for v in value_range.split("-"))
+        else:
+            first = last = int(value_range)
+        if first < low or last > high or first > last:
+            raise ValueError("cron field %r out of range %d-%d" % (field, low, high))
+        values.update(range(first, last + 1, int(step) if step else 1))
+    return values
+
+def cron_minutes_of_week(cron: str):
+    """Minutes since Sunday 00:00 a weekly cron fires at. Only minute, hour and day-of-week
+    may be restricted, day-of-month and month must be * so the schedule repeats every week."""
+    fields = cron.split()
+    if len(fields) != 5:
+        raise ValueError("cron %r needs 5 fields" % cron)
+    minute, hour, day_of_month, month, day_of_week = fields
+    if day_of_month != "*" or month != "*":
+        raise ValueError("cron %r: scaling windows must repeat weekly, day-of-month and month must be *" % cron)
+    # 7 is Sunday too
+    days = {day % 7 for day in _cron_field(day_of_week, 0, 7)}
+    return sorted(day * 24 * 60 + h * 60 + m
+                  for day in days
+                  for h in _cron_field(hour, 0, 23)
+                  for m in _cron_field(minute, 0, 59))
+
+def window_intervals(window: ScalingWindowArgs):
+    """[(start, end)] minutes of week, end may pass the end of the week. Every start has to be
+    followed by an end before the next start."""
+    starts = cron_minutes_of_week(window.start)
+    ends = cron_minutes_of_week(window.end)
+    # sorted, "end" would come before "start" at the same minute and pass as a week long window
+    if set(starts) & set(ends):
+        raise ValueError("window %s starts and ends at the same minute (%s, %s)"
+                         % (window.name, window.start, window.end))
+    events = sorted([(minute, "start") for minute in starts] + [(minute, "end") for minute in ends])
+    if not events:
+        return []
+    # rotate so the week starts on a start event, the schedule wraps around
+    first = next((i for i, (_, kind) in enumerate(events) if kind == "start"), None)
+    if first is None:
+        raise ValueError("window %s never starts" % window.name)
+    events = events[first:] + [(minute + MINUTES_PER_WEEK, kind) for minute, kind in events[:first]]
+    intervals = []
+    for i in range(0, len(events), 2):
+        pair = events[i:i + 2]
+        if len(pair) != 2 or pair[0][1] != "start" or pair[1][1] != "end":
+            raise ValueError("window %s: every start (%s) needs exactly one end (%s) before the next start"
+                             % (window.name, window.start, window.end))
+        intervals.append((pair[0][0], pair[1][0]))
+    return intervals
+
+def validate_windows(windows: Sequence[ScalingWindowArgs]):
+    """Raises ValueError for malformed crons, windows that don't close and overlapping windows"""
+    if len({window.time_zone for window in windows}) > 1:
+        raise ValueError("scaling windows of one resource must share a time zone")
+    intervals = []
+    for window in windows:
+        intervals.extend((start, end, window.name) for start, end in window_intervals(window))
+    # compare over two weeks so intervals crossing the end of the week are caught
+    intervals = sorted(intervals + [(start + MINUTES_PER_WEEK, end + MINUTES_PER_WEEK, name)
+                                    for start, end, name in intervals])
+    for (_, end, name), (next_start, _, next_name) in zip(intervals, intervals[1:]):
+        if next_start < end:
+            raise ValueError("scaling windows %s and %s overlap" % (name, next_name))
+
+def scaling_jobs(name: str,
+                 window: ScalingWindowArgs,
+                 uri,
+                 http_method: str,
+                 apply_body: dict,
+                 revert_body: dict,
+                 service_account_email,
+                 opts: ResourceOptions,
+                 region=region):
+    """Cloud Scheduler jobs calling a Google API at the start and end of the window.
+    https://www.pulumi.com/registry/packages/gcp/api-docs/cloudscheduler/job/"""
+    def job(suffix, schedule, body):
+        return cloudscheduler.Job(
+            resource_name="%s-%s-%s" % (name, window.name, suffix),
+            region=region,
+            schedule=schedule,
+            time_zone=window.time_zone,
+            attempt_deadline="320s",
+            retry_config=cloudscheduler.JobRetryConfigArgs(retry_count=3, min_backoff_duration="60s"),
+            http_target=cloudscheduler.JobHttpTargetArgs(
+                uri=uri,
+                http_method=http_method,
+                headers={"Content-Type": "application/json"},
+                body=base64.b64encode(json.dumps(body, sort_keys=True).encode()).decode(),
+                oauth_token=cloudscheduler.JobHttpTargetOauthTokenArgs(
+                    service_account_email=service_account_email,
+                    scope="https://www.googleapis.com/auth/cloud-platform")),
+            opts=opts)
+    return [job("apply", window.start, apply_body), job("revert", window.end, revert_body)]
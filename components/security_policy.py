@@ -0,0 +1,147 @@
+from typing import Sequence
+from pulumi import ComponentResource, ResourceOptions
+from pulumi_gcp import compute
+
+DEFAULT_RULE_PRIORITY = 2147483647
+
+class RateLimitRuleArgs:
+    def __init__(self,
+                 priority: int,
+                 count: int,
+                 interval_sec: int=60,
+                 action="throttle",
+                 enforce_on_key="IP",
+                 exceed_action="deny(429)",
+                 ban_duration_sec: int=None,
+                 ban_count: int=None,
+                 ban_interval_sec: int=None,
+                 expression: str=None,
+                 src_ip_ranges: Sequence[str]=["*"],
+                 preview=False,
+                 ):
+        # action is throttle (cap each client at count per interval) or
+        # rate_based_ban (block the client for ban_duration_sec once it crosses ban_count)
+        self.priority = priority
+        self.count = count
+        self.interval_sec = interval_sec
+        self.action = action
+        self.enforce_on_key = enforce_on_key
+        self.exceed_action = exceed_action
+        self.ban_duration_sec = ban_duration_sec
+        self.ban_count = ban_count
+        self.ban_interval_sec = ban_interval_sec
+        self.expression = expression
+        self.src_ip_ranges = src_ip_ranges
+        self.preview = preview
+
+class WafRuleArgs:
+    def __init__(self,
+                 priority: int,
+                 rule_set: str,
+                 sensitivity: int=1,
+                 action="deny(403)",
+                 preview=False,
+                 ):
+        # rule_set is a preconfigured WAF rule set, e.g. sqli-v33-stable, xss-v33-stable
+        self.priority = priority
+        self.rule_set = rule_set
+        self.sensitivity = sensitivity
+        self.action = action
+        self.preview = preview
+
+class SecurityPolicyArgs:
+    def __init__(self,
+                 name: str,
+                 rate_limits: Sequence[RateLimitRuleArgs]=[],
+                 waf_rules: Sequence[WafRuleArgs]=[],
+                 deny_ip_ranges: Sequence[str]=[],
+                 adaptive_protection=True,
+                 default_action="allow",
+                 ):
+        self.name = name
+        self.rate_limits = rate_limits
+        self.waf_rules = waf_rules
+        self.deny_ip_ranges = deny_ip_ranges
+        self.adaptive_protection = adaptive_protection
+        self.default_action = default_action
+
+def _match(expression: str=None, src_ip_ranges: Sequence[str]=None) -> compute.SecurityPolicyRuleMatchArgs:
+    if expression:
+        return compute.SecurityPolicyRuleMatchArgs(
+            expr=compute.SecurityPolicyRuleMatchExprArgs(expression=expression))
+    return compute.SecurityPolicyRuleMatchArgs(
+        versioned_expr="SRC_IPS_V1",
+        config=compute.SecurityPolicyRuleMatchConfigArgs(src_ip_ranges=src_ip_ranges))
+
+def _rate_limit_rule(rule: RateLimitRuleArgs) -> compute.SecurityPolicyRuleArgs:
+    ban_threshold = None
+    if rule.ban_count is not None:
+        ban_threshold = compute.SecurityPolicyRuleRateLimitOptionsBanThresholdArgs(
+            count=rule.ban_count,
+            interval_sec=rule.ban_interval_sec or rule.interval_sec)
+    return compute.SecurityPolicyRuleArgs(
+        action=rule.action,
+        priority=rule.priority,
+        preview=rule.preview,
+        description="{} {} requests per {}s per {}".format(rule.action, rule.count, rule.interval_sec, rule.enforce_on_key),
+        match=_match(rule.expression, rule.src_ip_ranges),
+        rate_limit_options=compute.SecurityPolicyRuleRateLimitOptionsArgs(
+            conform_action="allow",
+            exceed_action=rule.exceed_action,
+            enforce_on_key=rule.enforce_on_key,
+            rate_limit_threshold=compute.SecurityPolicyRuleRateLimitOptionsRateLimitThresholdArgs(
+                count=rule.count,
+                interval_sec=rule.interval_sec),
+            ban_duration_sec=rule.ban_duration_sec if rule.action == "rate_based_ban" else None,
+            ban_threshold=ban_threshold))
+
+def _waf_rule(rule: WafRuleArgs) -> compute.SecurityPolicyRuleArgs:
+    return compute.SecurityPolicyRuleArgs(
+        action=rule.action,
+        priority=rule.priority,
+        preview=rule.preview,
+        description="preconfigured WAF " + rule.rule_set,
+        match=_match("evaluatePreconfiguredWaf('{}', {{'sensitivity': {}}})".format(rule.rule_set, rule.sensitivity)))
+
+# Cloud Armor policy for the public load balancers: sheds abusive clients at the edge
+# before they reach the pods or Cloud SQL. Attach it to a LoadBalancer through
+# LoadBalancerArgs.security_policy.
+# https://www.pulumi.com/registry/packages/gcp/api-docs/compute/securitypolicy/
+# https://cloud.google.com/armor/docs/rate-limiting-overview
+class SecurityPolicy(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: SecurityPolicyArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+
+        rules = []
+        if args.deny_ip_ranges:
+            rules.append(compute.SecurityPolicyRuleArgs(
+                action="deny(403)",
+                priority=100,
+                description="denied ip ranges",
+                match=_match(src_ip_ranges=args.deny_ip_ranges)))
+        rules += [_waf_rule(rule) for rule in args.waf_rules]
+        rules += [_rate_limit_rule(rule) for rule in args.rate_limits]
+        rules.append(compute.SecurityPolicyRuleArgs(
+            action=args.default_action,
+            priority=DEFAULT_RULE_PRIORITY,
+            description="default rule",
+            match=_match(src_ip_ranges=["*"])))
+
+        priorities = [rule.priority for rule in rules]
+        if len(priorities) != len(set(priorities)):
+            raise ValueError("security policy rule priorities must be unique: {}".format(sorted(priorities)))
+
+        self.security_policy = compute.SecurityPolicy(
+            resource_name=name,
+            name=args.name,
+            type="CLOUD_ARMOR",
+            rules=rules,
+            adaptive_protection_config=compute.SecurityPolicyAdaptiveProtectionConfigArgs(
+                layer7_ddos_defense_config=compute.SecurityPolicyAdaptiveProtectionConfigLayer7DdosDefenseConfigArgs(
+                    enable=True)) if args.adaptive_protection else None,
+            opts=ResourceOptions(parent=self))
+        self.register_outputs({})
@@ -1,6 +1,79 @@
-from pulumi import ComponentResource, ResourceOptions
-from pulumi_gcp import sql
-from components.variables import region
+import copy
+from typing import Sequence
+from pulumi import ComponentResource, ResourceOptions, Output
+from pulumi_gcp import logging, sql, storage
+from components.gcs import StorageBucket, StorageBucketArgs
+from components.scaling import ScalingWindowArgs, validate_windows, scaling_jobs
+from components.variables import region, project_id
+
+# Query telemetry for Postgres instances: flags for pg_stat_statements, auto_explain and the
+# slow statement log, plus the Query Insights sampling settings.
+# https://cloud.google.com/sql/docs/postgres/flags
+# https://cloud.google.com/sql/docs/postgres/using-query-insights
+class DbTelemetryArgs:
+    def __init__(self,
+                 pg_stat_statements: bool=True,
+                 auto_explain: bool=True,
+                 log_min_duration_statement_ms: int=500,
+                 auto_explain_min_duration_ms: int=None,
+                 query_string_length: int=1024,
+                 query_plans_per_minute: int=5,
+                 record_application_tags: bool=True,
+                 record_client_address: bool=False,
+                 ) -> None:
+        # the extension still has to be created in each database: CREATE EXTENSION pg_stat_statements
+        self.pg_stat_statements = pg_stat_statements
+        self.auto_explain = auto_explain
+        # statements slower than this are logged with their duration, -1 disables
+        self.log_min_duration_statement_ms = log_min_duration_statement_ms
+        # plans of statements slower than this are logged, defaults to log_min_duration_statement_ms
+        self.auto_explain_min_duration_ms = auto_explain_min_duration_ms
+        # Query Insights: 256 - 4500 bytes
+        self.query_string_length = query_string_length
+        # Query Insights: sampled plans per minute, 0 - 20
+        self.query_plans_per_minute = query_plans_per_minute
+        self.record_application_tags = record_application_tags
+        self.record_client_address = record_client_address
+
+def telemetry_flags(telemetry: DbTelemetryArgs):
+    flags = {"log_min_duration_statement": telemetry.log_min_duration_statement_ms}
+    if telemetry.pg_stat_statements:
+        flags["pg_stat_statements.track"] = "all"
+    if telemetry.auto_explain:
+        flags["cloudsql.enable_auto_explain"] = "on"
+        flags["auto_explain.log_min_duration"] = (telemetry.log_min_duration_statement_ms
+                                                  if telemetry.auto_explain_min_duration_ms is None
+                                                  else telemetry.auto_explain_min_duration_ms)
+    return [sql.DatabaseInstanceSettingsDatabaseFlagArgs(name=name, value=str(value))
+            for name, value in flags.items()]
+
+def with_telemetry(settings: sql.DatabaseInstanceSettingsArgs,
+                   telemetry: DbTelemetryArgs) -> sql.DatabaseInstanceSettingsArgs:
+    """Copy of settings with the telemetry flags and insights config, flags already set win"""
+    settings = copy.copy(settings)
+    flags = list(settings.database_flags or [])
+    names = {flag.name for flag in flags}
+    flags.extend(flag for flag in telemetry_flags(telemetry) if flag.name not in names)
+    settings.database_flags = flags
+    settings.insights_config = sql.DatabaseInstanceSettingsInsightsConfigArgs(
+        query_insights_enabled=True,
+        query_string_length=telemetry.query_string_length,
+        query_plans_per_minute=telemetry.query_plans_per_minute,
+        record_application_tags=telemetry.record_application_tags,
+        record_client_address=telemetry.record_client_address)
+    return settings
+
+class DbScalingWindowArgs(ScalingWindowArgs):
+    def __init__(self,
+                 name: str,
+                 start: str,
+                 end: str,
+                 tier: str,
+                 time_zone: str="Etc/UTC",
+                 ):
+        super().__init__(name, start, end, time_zone)
+        # tier during the window, settings.tier is restored at the end
+        self.tier = tier
 
 class DbInstanceArgs:
     def __init__(self,
@@ -8,14 +81,38 @@ class DbInstanceArgs:
                  database_version,
                  settings: sql.DatabaseInstanceSettingsArgs,
                  region=region,
+                 clone: sql.DatabaseInstanceCloneArgs=None,
+                 telemetry: DbTelemetryArgs=None,
+                 scaling_windows: Sequence[DbScalingWindowArgs]=None,
+                 scaling_service_account=None,
                  depends_on=None
                  ) -> None:
         self.name = name
         self.region = region
         self.database_version = database_version
         self.settings = settings
+        self.clone = clone
+        self.telemetry = telemetry
+        # scheduled tier changes, applied by Cloud Scheduler jobs running as scaling_service_account
+        # (email, needs roles/cloudsql.editor). Changing the tier restarts the instance.
+        self.scaling_windows = scaling_windows or []
+        self.scaling_service_account = scaling_service_account
         self.depends_on = depends_on
 
+# Clone mode for DbInstanceArgs.clone: the new instance starts as a copy of source_instance_name
+# at point_in_time (RFC 3339, latest recoverable point when None). The source needs
+# point_in_time_recovery_enabled in its backup_configuration.
+# https://cloud.google.com/sql/docs/postgres/clone-instance
+def clone_from(source_instance_name,
+               point_in_time: str=None,
+               allocated_ip_range: str=None,
+               database_names=None) -> sql.DatabaseInstanceCloneArgs:
+    return sql.DatabaseInstanceCloneArgs(
+        source_instance_name=source_instance_name,
+        point_in_time=point_in_time,
+        allocated_ip_range=allocated_ip_range,
+        database_names=database_names)
+
 # DB instance
 # https://www.pulumi.com/registry/packages/gcp/api-docs/sql/databaseinstance/
 class DbInstance(ComponentResource):
@@ -24,15 +121,35 @@ class DbInstance(ComponentResource):
                  label: str,
                  args: DbInstanceArgs, 
                  opts: ResourceOptions = None):
+        # before anything is registered, a bad schedule must not leave a half created instance
+        if args.scaling_windows:
+            validate_windows(args.scaling_windows)
         super().__init__(label, name, {}, opts)
 
         self.database_instance = sql.DatabaseInstance(
             resource_name=name,
             region=args.region,
             database_version=args.database_version,
-            settings=args.settings,
+            settings=with_telemetry(args.settings, args.telemetry) if args.telemetry else args.settings,
             deletion_protection=args.settings.deletion_protection_enabled,
-            opts=ResourceOptions(parent=self, depends_on=args.depends_on))
+            clone=args.clone,
+            # the scheduler jobs own the tier while scaling windows are set
+            opts=ResourceOptions(parent=self, depends_on=args.depends_on,
+                                 ignore_changes=["settings.tier"] if args.scaling_windows else None))
+
+        self.scaling_jobs = []
+        if args.scaling_windows:
+            # https://cloud.google.com/sql/docs/postgres/admin-api/rest/v1/instances/patch
+            uri = Output.concat("https://sqladmin.googleapis.com/v1/projects/", project_id,
+                                "/instances/", self.database_instance.name)
+            for window in args.scaling_windows:
+                self.scaling_jobs.extend(scaling_jobs(
+                    name, window, uri, "PATCH",
+                    apply_body={"settings": {"tier": window.tier}},
+                    revert_body={"settings": {"tier": args.settings.tier}},
+                    service_account_email=args.scaling_service_account,
+                    opts=ResourceOptions(parent=self),
+                    region=args.region))
         self.register_outputs({})
 
 class DbArgs:
@@ -87,3 +204,68 @@ class DbUser(ComponentResource):
             instance=args.instance,
             opts=ResourceOptions(parent=self))
         self.register_outputs({})
+
+class DbSlowQueryLogArgs:
+    def __init__(self,
+                 instance: sql.DatabaseInstance,
+                 bucket_name: str,
+                 location=region,
+                 nearline_after_days: int=30,
+                 retention_days: int=365,
+                 ) -> None:
+        self.instance = instance
+        self.bucket_name = bucket_name
+        self.location = location
+        self.nearline_after_days = nearline_after_days
+        self.retention_days = retention_days
+
+# Routes the instance's slow statement and auto_explain plan log lines (see DbTelemetryArgs)
+# into a bucket, hourly files per log, to line query regressions up with deploys.
+# https://www.pulumi.com/registry/packages/gcp/api-docs/logging/projectsink/
+class DbSlowQueryLog(ComponentResource):
+    def __init__(self,
+                 name: str,
+                 label: str,
+                 args: DbSlowQueryLogArgs,
+                 opts: ResourceOptions = None):
+        super().__init__(label, name, {}, opts)
+
+        self.bucket = StorageBucket(
+            name,
+            "gcp:modules:storage:bucket:slowquerylog",
+            StorageBucketArgs(
+                args.bucket_name,
+                location=args.location,
+                storage_class="STANDARD",
+                uniform_bucket_level_access=True,
+                lifecycle_rules=[
+                    storage.BucketLifecycleRuleArgs(
+                        condition=storage.BucketLifecycleRuleConditionArgs(age=args.nearline_after_days),
+                        action=storage.BucketLifecycleRuleActionArgs(type="SetStorageClass", storage_class="NEARLINE")),
+                    storage.BucketLifecycleRuleArgs(
+                        condition=storage.BucketLifecycleRuleConditionArgs(age=args.retention_days),
+                        action=storage.BucketLifecycleRuleActionArgs(type="Delete")),
+                ],
+                versioning=storage.BucketVersioningArgs(enabled=False)),
+            opts=ResourceOptions(parent=self))
+
+        self.sink = logging.ProjectSink(
+            resource_name=name,
+            name=name,
+            destination=self.bucket.storage.name.apply(lambda bucket: "storage.googleapis.com/" + bucket),
+            # both log_min_duration_statement and auto_explain lines start with "duration:"
+            filter=Output.concat(
+                'resource.type="cloudsql_database" ',
+                'resource.labels.database_id="', project_id, ':', args.instance.name, '" ',
+                'logName="projects/', project_id, '/logs/cloudsql.googleapis.com%2Fpostgres.log" ',
+                'textPayload:"duration:"'),
+            unique_writer_identity=True,
+            opts=ResourceOptions(parent=self))
+
+        self.sink_writer = storage.BucketIAMMember(
+            resource_name=name + "-writer",
+            bucket=self.bucket.storage.name,
+            role="roles/storage.objectCreator",
+            member=self.sink.writer_identity,
+            opts=ResourceOptions(parent=self))
+        self.register_outputs({})
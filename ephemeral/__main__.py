@@ -0,0 +1,34 @@
+"""Per pull request environment on top of the base stack, see components/ephemeral.py"""
+
+import os
+import sys
+import pulumi
+
+# components live in the parent project
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.variables import project_id
+from components.ephemeral import EphemeralEnvironment, EphemeralEnvironmentArgs
+
+# Usually driven by: python -m tools.ephemeral [up|destroy|gc]
+# Stack config:
+#   baseStack   fully qualified base stack, e.g. organization/pulumi-exercise/gcp
+#   dbPassword  secret, generated by tools.ephemeral
+config = pulumi.Config()
+
+environment = EphemeralEnvironment(
+    pulumi.get_stack(),
+    "gcp:modules:ephemeral:onxp",
+    EphemeralEnvironmentArgs(
+        name=pulumi.get_stack(),
+        base_stack=config.require("baseStack"),
+        db_password=config.require_secret("dbPassword"),
+        project_id=project_id
+    )
+)
+
+pulumi.export("namespace", environment.namespace.metadata.name)
+pulumi.export("database", environment.database.database.name)
+pulumi.export("databaseUser", environment.database_user.database.name)
+pulumi.export("serviceAccountEmail", environment.service_account.service_account.email)
+pulumi.export("kubernetesServiceAccount", environment.kubernetes_service_account.metadata.name)
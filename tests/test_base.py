@@ -0,0 +1,35 @@
+from pulumi.automation._cmd import CommandResult
+from pulumi.automation.errors import CommandError
+from components.base import DEFAULT_RETRY_POLICY, error_lines
+
+def command_error(stdout: str, stderr: str="") -> str:
+    return str(CommandError(CommandResult(stdout=stdout, stderr=stderr, code=255)))
+
+def test_transient_gcp_errors():
+    for stdout in [
+        "    error: 1 error occurred:\n\t* googleapi: Error 409: Operation operation-123 is already in progress",
+        "    error: 1 error occurred:\n\t* googleapi: Error 409: There were concurrent policy changes.",
+        "    error: 1 error occurred:\n\t* googleapi: Error 503: Backend Error",
+        "    error: rpc error: code = Unavailable desc = connection closed",
+    ]:
+        assert DEFAULT_RETRY_POLICY.is_transient(command_error(stdout)), stdout
+
+def test_deterministic_errors():
+    for stdout in [
+        "    error: 1 error occurred:\n\t* googleapi: Error 409: Already exists",
+        "    error: 1 error occurred:\n\t* googleapi: Error 400: Invalid value for field",
+    ]:
+        assert not DEFAULT_RETRY_POLICY.is_transient(command_error(stdout)), stdout
+
+def test_only_error_lines_are_matched():
+    stdout = ("Updating (gcp):\n"
+              "    pulumi:pulumi:Stack pulumi-exercise-gcp  the replica is unavailable until promoted\n"
+              "    error: 1 error occurred:\n\t* googleapi: Error 400: Invalid value for field")
+    assert "the replica is unavailable until promoted" not in " ".join(error_lines(command_error(stdout)))
+    assert not DEFAULT_RETRY_POLICY.is_transient(command_error(stdout))
+    # stderr is matched as a whole
+    assert DEFAULT_RETRY_POLICY.is_transient(command_error("", "read: connection reset by peer"))
+
+def test_grpc_codes_are_case_sensitive():
+    assert not DEFAULT_RETRY_POLICY.is_transient("error: the bucket is unavailable in this location")
+    assert DEFAULT_RETRY_POLICY.is_transient('error: "status": "UNAVAILABLE"')
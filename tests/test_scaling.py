@@ -0,0 +1,116 @@
+import base64
+import json
+import pytest
+from pulumi_gcp import container, sql
+from components.node_pool import NodePool, NodePoolArgs, NodePoolScalingWindowArgs
+from components.scaling import MINUTES_PER_WEEK, ScalingWindowArgs, validate_windows, window_intervals
+from components.sql import DbInstance, DbInstanceArgs, DbScalingWindowArgs
+from components.variables import project_id, zone
+from tools.mocks import collect, set_mocks
+
+MONDAY = 24 * 60
+
+def test_weekday_window():
+    window = ScalingWindowArgs("peak", start="0 8 * * 1-5", end="0 20 * * 1-5")
+    intervals = window_intervals(window)
+    assert len(intervals) == 5
+    assert intervals[0] == (MONDAY + 8 * 60, MONDAY + 20 * 60)
+
+def test_window_wrapping_around_the_week():
+    # Saturday 22:00 to Sunday 06:00, Sunday is the start of the week
+    window = ScalingWindowArgs("weekend-batch", start="0 22 * * 6", end="0 6 * * 0")
+    assert window_intervals(window) == [(6 * MONDAY + 22 * 60, MINUTES_PER_WEEK + 6 * 60)]
+    validate_windows([window])
+
+def test_overlapping_windows():
+    with pytest.raises(ValueError, match="overlap"):
+        validate_windows([
+            ScalingWindowArgs("peak", start="0 8 * * 1-5", end="0 20 * * 1-5"),
+            ScalingWindowArgs("batch", start="0 18 * * 1", end="0 22 * * 1"),
+        ])
+
+def test_overlap_across_the_end_of_the_week():
+    with pytest.raises(ValueError, match="overlap"):
+        validate_windows([
+            ScalingWindowArgs("weekend-batch", start="0 22 * * 6", end="0 6 * * 0"),
+            ScalingWindowArgs("sunday", start="0 4 * * 0", end="0 8 * * 0"),
+        ])
+
+@pytest.mark.parametrize("cron", ["0 8 * *", "0 25 * * 1", "0 8 1 * 1", "x 8 * * 1"])
+def test_malformed_cron(cron):
+    with pytest.raises(ValueError):
+        validate_windows([ScalingWindowArgs("bad", start=cron, end="0 20 * * 1")])
+
+def test_identical_start_and_end():
+    with pytest.raises(ValueError, match="same minute"):
+        validate_windows([ScalingWindowArgs("empty", start="0 8 * * 1", end="0 8 * * 1")])
+
+def test_start_without_end():
+    with pytest.raises(ValueError, match="needs exactly one end"):
+        validate_windows([ScalingWindowArgs("open", start="0 8 * * 1-5", end="0 20 * * 5")])
+
+# The components under mocks: the scheduler jobs and the ignore_changes they rely on
+
+def jobs(graph):
+    """{schedule: (uri, method, decoded body)} of the registered scheduler jobs"""
+    registered = [r for r in graph.resources.values() if r.type == "gcp:cloudscheduler/job:Job"]
+    return {job.inputs["schedule"]: (job.inputs["httpTarget"]["uri"],
+                                     job.inputs["httpTarget"]["httpMethod"],
+                                     json.loads(base64.b64decode(job.inputs["httpTarget"]["body"])))
+            for job in registered}, len(registered)
+
+def test_db_instance_scaling_jobs():
+    monitor = set_mocks()
+    DbInstance(
+        "onxp-sql",
+        "gcp:modules:sql:instance:test",
+        DbInstanceArgs(
+            name="onxp-sql",
+            database_version="POSTGRES_15",
+            settings=sql.DatabaseInstanceSettingsArgs(tier="db-f1-micro"),
+            scaling_windows=[DbScalingWindowArgs("peak", start="0 8 * * 1-5", end="0 20 * * 1-5", tier="db-g1-small")],
+            scaling_service_account="scaler@project.iam.gserviceaccount.com"))
+    graph = collect(monitor, {}, [])
+
+    by_schedule, count = jobs(graph)
+    uri = "https://sqladmin.googleapis.com/v1/projects/" + project_id + "/instances/onxp-sql"
+    assert count == 2
+    assert by_schedule == {
+        "0 8 * * 1-5": (uri, "PATCH", {"settings": {"tier": "db-g1-small"}}),
+        "0 20 * * 1-5": (uri, "PATCH", {"settings": {"tier": "db-f1-micro"}}),
+    }
+    instance = next(r for r in graph.resources.values() if r.type == "gcp:sql/databaseInstance:DatabaseInstance")
+    assert instance.ignore_changes == ["settings.tier"]
+
+def test_node_pool_scaling_jobs():
+    monitor = set_mocks()
+    cluster = container.Cluster("onxp-cluster", name="onxp-cluster", location=zone)
+    NodePool(
+        "onxp-nodepool",
+        "gcp:modules:kubernetes:nodepool:test",
+        NodePoolArgs(
+            name="onxp-nodepool",
+            cluster=cluster,
+            node_config=container.ClusterNodeConfigArgs(machine_type="e2-medium"),
+            autoscaling=container.NodePoolAutoscalingArgs(min_node_count=1, max_node_count=3),
+            management=container.NodePoolManagementArgs(auto_repair=True),
+            scaling_windows=[NodePoolScalingWindowArgs("peak", start="0 8 * * 1-5", end="0 20 * * 1-5",
+                                                       min_node_count=2, max_node_count=4)],
+            scaling_service_account="scaler@project.iam.gserviceaccount.com"))
+    graph = collect(monitor, {}, [])
+
+    by_schedule, count = jobs(graph)
+    uri = ("https://container.googleapis.com/v1/projects/" + project_id + "/locations/" + zone +
+           "/clusters/onxp-cluster/nodePools/onxp-nodepool:setAutoscaling")
+
+    def autoscaling(min_node_count, max_node_count):
+        return {"autoscaling": {"enabled": True, "minNodeCount": min_node_count,
+                                "maxNodeCount": max_node_count, "locationPolicy": "BALANCED"}}
+
+    assert count == 2
+    assert by_schedule == {
+        "0 8 * * 1-5": (uri, "POST", autoscaling(2, 4)),
+        "0 20 * * 1-5": (uri, "POST", autoscaling(1, 3)),
+    }
+    pool = next(r for r in graph.resources.values() if r.type == "gcp:container/nodePool:NodePool")
+    assert sorted(pool.ignore_changes) == ["autoscaling.maxNodeCount", "autoscaling.minNodeCount"]
@@ -0,0 +1,24 @@
+import pytest
+from tools.mocks import run_program
+from tools.targeted_deploy import affected_urns
+
+BUCKETS = {
+    "urn:pulumi:gcp::pulumi-exercise::gcp:modules:storage:bucket:onxp$gcp:storage/bucket:Bucket::onxp-bucket",
+    "urn:pulumi:gcp::pulumi-exercise::gcp:modules:sql:slowquerylog:onxp$gcp:modules:storage:bucket:slowquerylog$gcp:storage/bucket:Bucket::onxp-sql-slow-queries",
+    "urn:pulumi:gcp::pulumi-exercise::gcp:modules:cloudbuild:workerpool:onxp$gcp:modules:storage:bucket:buildcache$gcp:storage/bucket:Bucket::onxp-build-cache",
+}
+
+@pytest.fixture(scope="module")
+def graph():
+    return run_program()
+
+def test_file_maps_to_nested_components(graph):
+    # two of the buckets are created inside DbSlowQueryLog and BuildWorkerPool
+    urns, reason = affected_urns(["components/gcs.py"], graph)
+    assert reason is None
+    assert BUCKETS <= urns
+
+def test_unowned_file_falls_back_to_full_run(graph):
+    urns, reason = affected_urns(["__main__.py"], graph)
+    assert urns is None
+    assert "__main__.py" in reason
@@ -0,0 +1,46 @@
+from tools.plan_snapshot import load, snapshot_path
+from tools.teardown import layers
+
+CLUSTER = "urn:pulumi:gcp::pulumi-exercise::gcp:modules:kubernetes:cluster:onxp$gcp:container/cluster:Cluster::onxp-cluster"
+K8S_PROVIDER = "urn:pulumi:gcp::pulumi-exercise::gcp:modules:kubernetes:provider:onxp$pulumi:providers:kubernetes::onxp-k8s"
+CONNECTION = "urn:pulumi:gcp::pulumi-exercise::gcp:modules:vpc:vpcpeering:onxp$gcp:servicenetworking/connection:Connection::onxp-service-networking-connection"
+
+def checkpoint():
+    """Checkpoint resources as `pulumi stack export` lists them, built from the committed snapshot"""
+    resources = load(snapshot_path("gcp"))
+    parents = {entry["parent"] for entry in resources.values()}
+    checkpoint = []
+    for urn, entry in resources.items():
+        resource = {
+            "urn": urn,
+            "type": entry["type"],
+            # every component has children, no custom resource has
+            "custom": urn not in parents,
+            "parent": entry["parent"],
+            "dependencies": entry["dependencies"],
+        }
+        if "provider" in entry:
+            resource["provider"] = entry["provider"] + "::" + entry["name"] + "_id"
+        checkpoint.append(resource)
+    return checkpoint
+
+def layer_of(plan):
+    return {urn: i for i, layer in enumerate(plan) for urn in layer}
+
+def test_kubernetes_objects_and_provider_go_before_the_cluster():
+    resources = checkpoint()
+    layer = layer_of(layers(resources))
+    kubernetes_objects = [r["urn"] for r in resources if r.get("provider", "").startswith(K8S_PROVIDER + "::")]
+    assert kubernetes_objects
+    for urn in kubernetes_objects:
+        assert layer[urn] < layer[K8S_PROVIDER], urn
+    assert layer[K8S_PROVIDER] < layer[CLUSTER]
+
+def test_connection_goes_after_its_consumers():
+    resources = checkpoint()
+    layer = layer_of(layers(resources))
+    consumers = [r["urn"] for r in resources
+                 if r["type"] in ("gcp:sql/databaseInstance:DatabaseInstance", "gcp:filestore/instance:Instance")]
+    assert consumers
+    for urn in consumers:
+        assert layer[urn] < layer[CONNECTION], urn
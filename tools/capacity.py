@@ -0,0 +1,212 @@
+"""Capacity report: the throughput envelope of the declared stack, evaluated offline
+
+Usage: python -m tools.capacity [--stack NAME] [--connections-per-node 10]
+
+Runs the program under mocks and reads the limits off the registered inputs: node pool
+compute between the autoscaling bounds, pod/service/node IPs from the subnetwork ranges,
+NAT ports, Cloud SQL connections and IOPS, persistent disk IOPS. Every limit that can be
+expressed in nodes is compared with the node pools' max size; the ones that cap the
+cluster below it are flagged, the lowest one is the bottleneck.
+"""
+
+import argparse
+import ipaddress
+import os
+import sys
+from components.machine_types import machine_type, allocatable
+from tools.mocks import PROJECT_DIR, STACK, run_program
+
+NODE_POOL = "gcp:container/nodePool:NodePool"
+CLUSTER = "gcp:container/cluster:Cluster"
+SUBNETWORK = "gcp:compute/subnetwork:Subnetwork"
+ROUTER_NAT = "gcp:compute/routerNat:RouterNat"
+SQL_INSTANCE = "gcp:sql/databaseInstance:DatabaseInstance"
+DISK = "gcp:compute/disk:Disk"
+
+# https://cloud.google.com/kubernetes-engine/docs/how-to/flexible-pod-cidr
+DEFAULT_MAX_PODS_PER_NODE = 110
+
+# https://cloud.google.com/nat/docs/ports-and-addresses
+PORTS_PER_NAT_IP = 64512
+DEFAULT_MIN_PORTS_PER_VM = 64
+
+# Postgres max_connections default by tier memory (GB, lower bound)
+# https://cloud.google.com/sql/docs/postgres/flags#postgres-m
+POSTGRES_MAX_CONNECTIONS = [(120, 1000), (60, 800), (30, 600), (15, 500), (7.5, 400), (6, 200), (3.75, 100), (1.7, 50), (0, 25)]
+SQL_SHARED_CORE_MEMORY_GB = {"db-f1-micro": 0.614, "db-g1-small": 1.7}
+
+# (baseline, read IOPS per GB) for persistent disks
+# https://cloud.google.com/compute/docs/disks/performance
+DISK_IOPS = {
+    "pd-standard": (0, 0.75),
+    "pd-balanced": (3000, 6),
+    "pd-ssd": (6000, 30),
+}
+# read IOPS per GB for Cloud SQL storage, no baseline
+# https://cloud.google.com/sql/docs/postgres/storage-options
+SQL_DISK_IOPS_PER_GB = {"PD_SSD": 30, "PD_HDD": 0.75}
+
+class Limit:
+    def __init__(self,
+                 name: str,
+                 value: str,
+                 max_nodes: int=None):
+        self.name = name
+        # human readable capacity
+        self.value = value
+        # nodes the cluster can grow to before this limit is hit, None if it doesn't scale with nodes
+        self.max_nodes = max_nodes
+
+def _of_type(graph, type_):
+    return [r.inputs for r in graph.resources.values() if r.type == type_]
+
+def _addresses(cidr: str) -> int:
+    return ipaddress.ip_network(cidr).num_addresses
+
+def node_pool_limits(pools):
+    """Returns (limits, max nodes over every pool, max pods per node)"""
+    limits = []
+    total_min = total_max = 0
+    pods_per_node = DEFAULT_MAX_PODS_PER_NODE
+    cpu = [0, 0]
+    memory = [0, 0]
+    for pool in pools:
+        autoscaling = pool.get("autoscaling") or {}
+        count = pool.get("nodeCount") or pool.get("initialNodeCount") or 1
+        minimum = int(autoscaling.get("minNodeCount", autoscaling.get("totalMinNodeCount", count)))
+        maximum = int(autoscaling.get("maxNodeCount", autoscaling.get("totalMaxNodeCount", count)))
+        # per-zone bounds scale with the node locations
+        if "minNodeCount" in autoscaling:
+            zones = len(pool.get("nodeLocations") or [None])
+            minimum, maximum = minimum * zones, maximum * zones
+        machine = machine_type((pool.get("nodeConfig") or {}).get("machineType", "e2-medium"))
+        node_cpu, node_memory = allocatable(machine)
+        cpu[0] += minimum * node_cpu
+        cpu[1] += maximum * node_cpu
+        memory[0] += minimum * node_memory
+        memory[1] += maximum * node_memory
+        total_min += minimum
+        total_max += maximum
+        pods_per_node = int((pool.get("maxPodsConstraint") or {}).get("maxPodsPerNode", pods_per_node))
+    limits.append(Limit("nodes", "%d - %d" % (total_min, total_max), total_max))
+    limits.append(Limit("allocatable vCPU", "%.2f - %.2f" % tuple(cpu)))
+    limits.append(Limit("allocatable memory", "%.2f - %.2f GB" % tuple(memory)))
+    limits.append(Limit("pods (max per node)", "%d - %d" % (total_min * pods_per_node, total_max * pods_per_node)))
+    return limits, total_max, pods_per_node
+
+def subnetwork_limits(subnetworks, clusters, pods_per_node):
+    limits = []
+    policy = (clusters[0].get("ipAllocationPolicy") or {}) if clusters else {}
+    for subnetwork in subnetworks:
+        ranges = {r["rangeName"]: r["ipCidrRange"] for r in subnetwork.get("secondaryIpRanges") or []}
+        pods = ranges.get(policy.get("clusterSecondaryRangeName"))
+        services = ranges.get(policy.get("servicesSecondaryRangeName"))
+        if pods is None:
+            continue
+        # 4 addresses per primary range are reserved by GCP
+        nodes = _addresses(subnetwork["ipCidrRange"]) - 4
+        limits.append(Limit("node IPs " + subnetwork["ipCidrRange"], "%d nodes" % nodes, nodes))
+        # each node gets a block of twice its max pods, rounded up to a power of two
+        block = 1 << (2 * pods_per_node - 1).bit_length()
+        pod_nodes = _addresses(pods) // block
+        limits.append(Limit("pod IPs " + pods, "%d pods (/%d per node)" % (_addresses(pods), 32 - block.bit_length() + 1), pod_nodes))
+        if services is not None:
+            limits.append(Limit("service IPs " + services, "%d services" % _addresses(services)))
+    return limits
+
+def nat_limits(nats):
+    limits = []
+    for nat in nats:
+        ports_per_vm = int(nat.get("minPortsPerVm", DEFAULT_MIN_PORTS_PER_VM))
+        if nat.get("natIpAllocateOption") == "AUTO_ONLY":
+            limits.append(Limit("NAT " + nat.get("name", ""), "auto-allocated IPs, %d ports per VM" % ports_per_vm))
+            continue
+        ips = len(nat.get("natIps") or [])
+        ports = ips * PORTS_PER_NAT_IP
+        limits.append(Limit(
+            "NAT " + nat.get("name", ""),
+            "%d IPs, %d concurrent connections per destination, %d per VM" % (ips, ports, ports_per_vm),
+            ports // ports_per_vm))
+    return limits
+
+def sql_memory_gb(tier: str):
+    if tier in SQL_SHARED_CORE_MEMORY_GB:
+        return SQL_SHARED_CORE_MEMORY_GB[tier]
+    parts = tier.split("-")
+    if parts[1] == "custom":
+        return int(parts[3]) / 1024
+    return machine_type("-".join(parts[1:])).memory_gb
+
+def sql_max_connections(instance):
+    settings = instance.get("settings") or {}
+    for flag in settings.get("databaseFlags") or []:
+        if flag.get("name") == "max_connections":
+            return int(flag["value"])
+    if not instance.get("databaseVersion", "").startswith("POSTGRES"):
+        return None
+    memory = sql_memory_gb(settings.get("tier", ""))
+    return next(connections for floor, connections in POSTGRES_MAX_CONNECTIONS if memory >= floor)
+
+def disk_iops(disk_type: str, size_gb: int) -> int:
+    baseline, per_gb = DISK_IOPS[disk_type]
+    return int(baseline + per_gb * size_gb)
+
+def sql_limits(instances, connections_per_node: int):
+    limits = []
+    for instance in instances:
+        settings = instance.get("settings") or {}
+        tier = settings.get("tier", "")
+        connections = sql_max_connections(instance)
+        if connections is None:
+            limits.append(Limit("SQL connections " + tier, "unknown for " + instance.get("databaseVersion", "")))
+        else:
+            limits.append(Limit("SQL connections " + tier, "%d" % connections, connections // connections_per_node))
+        disk_type = settings.get("diskType", "PD_SSD")
+        size = int(settings.get("diskSize", 10))
+        limits.append(Limit(
+            "SQL IOPS %s %dGB" % (disk_type, size),
+            "%d%s" % (SQL_DISK_IOPS_PER_GB[disk_type] * size, ", grows with disk autoresize" if settings.get("diskAutoresize") else "")))
+    return limits
+
+def disk_limits(disks):
+    limits = []
+    for disk in disks:
+        disk_type = disk.get("type", "pd-standard")
+        size = int(disk.get("size", 10))
+        limits.append(Limit("disk IOPS %s %dGB" % (disk_type, size), "%d" % disk_iops(disk_type, size)))
+    return limits
+
+def report(graph, connections_per_node: int):
+    """Returns (limits, bottleneck, node pool max). Limits below the node pool max cap the cluster"""
+    pool_limits, max_nodes, pods_per_node = node_pool_limits(_of_type(graph, NODE_POOL))
+    limits = pool_limits
+    limits += subnetwork_limits(_of_type(graph, SUBNETWORK), _of_type(graph, CLUSTER), pods_per_node)
+    limits += nat_limits(_of_type(graph, ROUTER_NAT))
+    limits += sql_limits(_of_type(graph, SQL_INSTANCE), connections_per_node)
+    limits += disk_limits(_of_type(graph, DISK))
+    scaling = [limit for limit in limits if limit.max_nodes is not None]
+    bottleneck = min(scaling, key=lambda limit: limit.max_nodes) if scaling else None
+    return limits, bottleneck, max_nodes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stack", default=STACK)
+    parser.add_argument("--connections-per-node", type=int, default=10,
+                        help="SQL connections the workloads on one node open (pool sizes x replicas)")
+    args = parser.parse_args(argv)
+
+    limits, bottleneck, max_nodes = report(run_program(stack=args.stack), args.connections_per_node)
+    print("%-40s %-60s %9s" % ("limit", "capacity", "max nodes"))
+    for limit in limits:
+        flag = ""
+        if limit is bottleneck:
+            flag = "  <- bottleneck"
+        elif limit.max_nodes is not None and limit.max_nodes < max_nodes:
+            flag = "  <- below node pool max"
+        print("%-40s %-60s %9s%s" % (
+            limit.name, limit.value, "-" if limit.max_nodes is None else limit.max_nodes, flag))
+    return 0
+
+if __name__ == "__main__":
+    os.chdir(PROJECT_DIR)
+    sys.exit(main())
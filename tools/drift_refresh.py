@@ -0,0 +1,161 @@
+"""Selective drift refresh: only read back the resources whose state is likely to drift
+
+Usage: python -m tools.drift_refresh [--class NAME ...] [--force] [--apply] [--stack NAME]
+
+Without --apply the refresh is a preview and only reports drift; with --apply the
+refreshed state is written back. Last run times are kept per stack in .drift-refresh.json
+so the command can be put on a cron and only refresh the classes that are due.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pulumi.automation.events import OpType
+from tools.mocks import PROJECT_DIR, STACK
+from tools.stack import select_stack, on_output, run_with_retry
+from tools.stack_outputs import invalidate
+
+STATE_FILE = os.path.join(PROJECT_DIR, ".drift-refresh.json")
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+class DriftClass:
+    def __init__(self,
+                 name: str,
+                 interval: int,
+                 matches):
+        self.name = name
+        # seconds between refreshes
+        self.interval = interval
+        # (type, inputs) -> bool
+        self.matches = matches
+
+def _sql_autoresize(type_, inputs):
+    return (type_ == "gcp:sql/databaseInstance:DatabaseInstance"
+            and (inputs.get("settings") or {}).get("diskAutoresize", False))
+
+# Most to least drift-prone, a resource belongs to the first class that matches.
+DRIFT_CLASSES = [
+    # node count moves under the cluster autoscaler
+    DriftClass("autoscaling", 15 * MINUTE,
+               lambda t, i: t == "gcp:container/nodePool:NodePool" and bool(i.get("autoscaling"))),
+    # disk size grows under disk_autoresize
+    DriftClass("autoresize", HOUR, _sql_autoresize),
+    # ACLs and IAM get edited by hand in the console
+    DriftClass("acl", 6 * HOUR,
+               lambda t, i: t.startswith(("gcp:storage/bucketACL:", "gcp:storage/bucketAccessControl:",
+                                          "gcp:projects/iAMMember:", "gcp:projects/iAMBinding:"))),
+    DriftClass("static", 7 * DAY, lambda t, i: True),
+]
+
+def classify(resources):
+    """resources: checkpoint resources from `pulumi stack export`. Returns {class name: [urn]}"""
+    classes = {c.name: [] for c in DRIFT_CLASSES}
+    for resource in resources:
+        if not resource.get("custom"):
+            # components and the stack have nothing to read back
+            continue
+        type_ = resource["type"]
+        if type_.startswith("pulumi:providers:"):
+            continue
+        inputs = resource.get("inputs") or {}
+        for drift_class in DRIFT_CLASSES:
+            if drift_class.matches(type_, inputs):
+                classes[drift_class.name].append(resource["urn"])
+                break
+    return classes
+
+def _load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        state = json.load(f)
+    # {stack: {class name: last run}}, entries of the older flat layout are dropped
+    return {stack: runs for stack, runs in state.items() if isinstance(runs, dict)}
+
+def load_last_runs(stack_name: str):
+    return _load_state().get(stack_name, {})
+
+def save_last_runs(stack_name: str, last_runs):
+    state = _load_state()
+    state[stack_name] = last_runs
+    with open(STATE_FILE, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+def due_classes(last_runs, now):
+    return [c.name for c in DRIFT_CLASSES if now - last_runs.get(c.name, 0) >= c.interval]
+
+def batches(urns, size):
+    for i in range(0, len(urns), size):
+        yield urns[i:i + size]
+
+def refresh(stack, urns, apply: bool, parallel: int, batch_size: int):
+    """Refreshes urns in batches and returns {urn: [changed properties]}"""
+    drift = {}
+
+    def on_event(event):
+        # a refresh step's pre-event has no diffs yet, they come with the outputs event once the
+        # resource was read; resources deleted outside pulumi show up as delete steps
+        for step in (event.resource_pre_event, event.res_outputs_event):
+            metadata = step.metadata if step is not None else None
+            if metadata is None:
+                continue
+            if metadata.diffs:
+                drift[metadata.urn] = list(metadata.diffs)
+            elif metadata.op == OpType.DELETE:
+                drift[metadata.urn] = ["<deleted>"]
+            elif metadata.op == OpType.UPDATE:
+                drift.setdefault(metadata.urn, ["<changed>"])
+
+    for batch in batches(sorted(urns), batch_size):
+        run = stack.refresh if apply else stack.preview_refresh
+        run_with_retry(lambda: run(target=batch, parallel=parallel, on_event=on_event, on_output=on_output))
+    return drift
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stack", default=STACK)
+    parser.add_argument("--class", dest="classes", action="append",
+                        choices=[c.name for c in DRIFT_CLASSES],
+                        help="refresh this class regardless of schedule (repeatable)")
+    parser.add_argument("--force", action="store_true", help="refresh every class except static")
+    parser.add_argument("--apply", action="store_true", help="write refreshed state instead of only reporting drift")
+    parser.add_argument("--parallel", type=int, default=10, help="resources read concurrently per batch")
+    parser.add_argument("--batch-size", type=int, default=25, help="urns per refresh operation")
+    args = parser.parse_args(argv)
+
+    now = time.time()
+    last_runs = load_last_runs(args.stack)
+    if args.classes:
+        selected = args.classes
+    elif args.force:
+        selected = [c.name for c in DRIFT_CLASSES if c.name != "static"]
+    else:
+        selected = due_classes(last_runs, now)
+    if not selected:
+        print("nothing due")
+        return 0
+
+    stack = select_stack(args.stack)
+    classes = classify(stack.export_stack().deployment.get("resources", []))
+    urns = [urn for name in selected for urn in classes[name]]
+    print("refreshing %s (%d resources)" % (", ".join(selected), len(urns)))
+
+    drift = refresh(stack, urns, args.apply, args.parallel, args.batch_size) if urns else {}
+    if args.apply and urns:
+        invalidate(args.stack)
+    for urn, properties in sorted(drift.items()):
+        print("drift: %s: %s" % (urn, ", ".join(properties)))
+    print("%d of %d resources drifted" % (len(drift), len(urns)))
+
+    for name in selected:
+        last_runs[name] = now
+    save_last_runs(args.stack, last_runs)
+    return 1 if drift and not args.apply else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
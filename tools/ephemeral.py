@@ -0,0 +1,105 @@
+"""Per pull request environments: create, destroy and garbage-collect ephemeral/ stacks
+
+Usage: python -m tools.ephemeral up PR [--base-stack NAME]
+       python -m tools.ephemeral destroy PR
+       python -m tools.ephemeral gc [--ttl HOURS] [--open PR,PR...]
+
+Each environment is a pr-<number> stack of the ephemeral/ project. It only creates a database
+and user on the base stack's SQL instance, a namespace and a workload identity service
+account, so up takes seconds. gc destroys the environments whose pull request is no
+longer open (when --open is given) or that haven't been updated for --ttl hours; run it on a
+schedule and when pull requests close.
+"""
+
+import argparse
+import datetime
+import os
+import secrets
+import sys
+from pulumi import automation as auto
+from tools.mocks import PROJECT, PROJECT_DIR, STACK
+from tools.stack import on_output, run_with_retry
+from tools.stack_outputs import invalidate
+
+EPHEMERAL_DIR = os.path.join(PROJECT_DIR, "ephemeral")
+EPHEMERAL_PROJECT = PROJECT + "-ephemeral"
+STACK_PREFIX = "pr-"
+
+def stack_name(pr: int) -> str:
+    return STACK_PREFIX + str(pr)
+
+def _workspace() -> auto.LocalWorkspace:
+    return auto.LocalWorkspace(work_dir=EPHEMERAL_DIR)
+
+def up(pr: int, base_stack: str):
+    stack = auto.create_or_select_stack(stack_name=stack_name(pr), work_dir=EPHEMERAL_DIR)
+    stack.set_config("baseStack", auto.ConfigValue(base_stack))
+    # generated once, kept across ups
+    if EPHEMERAL_PROJECT + ":dbPassword" not in stack.get_all_config():
+        stack.set_config("dbPassword", auto.ConfigValue(secrets.token_urlsafe(24), secret=True))
+    try:
+        result = run_with_retry(lambda: stack.up(on_output=on_output))
+    finally:
+        invalidate(stack_name(pr))
+    return {name: output.value for name, output in result.outputs.items()}
+
+def destroy(name: str):
+    stack = auto.select_stack(stack_name=name, work_dir=EPHEMERAL_DIR)
+    try:
+        run_with_retry(lambda: stack.destroy(on_output=on_output))
+    finally:
+        invalidate(name)
+    _workspace().remove_stack(name)
+
+def expired(stacks, now: datetime.datetime, ttl: datetime.timedelta, open_prs=None):
+    """stacks: StackSummary list. Returns the names of the environments to collect"""
+    names = []
+    for summary in stacks:
+        if not summary.name.startswith(STACK_PREFIX):
+            continue
+        pr = summary.name[len(STACK_PREFIX):]
+        closed = open_prs is not None and pr not in open_prs
+        last_update = summary.last_update
+        if last_update is not None and last_update.tzinfo is None:
+            last_update = last_update.replace(tzinfo=datetime.timezone.utc)
+        stale = last_update is not None and now - last_update > ttl
+        if closed or stale:
+            names.append(summary.name)
+    return sorted(names)
+
+def gc(ttl_hours: float, open_prs=None, dry_run=False):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    names = expired(_workspace().list_stacks(), now, datetime.timedelta(hours=ttl_hours), open_prs)
+    for name in names:
+        print("collecting " + name)
+        if not dry_run:
+            destroy(name)
+    return names
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    up_parser = commands.add_parser("up")
+    up_parser.add_argument("pr", type=int)
+    up_parser.add_argument("--base-stack", default="organization/%s/%s" % (PROJECT, STACK),
+                           help="fully qualified base stack")
+    destroy_parser = commands.add_parser("destroy")
+    destroy_parser.add_argument("pr", type=int)
+    gc_parser = commands.add_parser("gc")
+    gc_parser.add_argument("--ttl", type=float, default=72, help="hours since the last update")
+    gc_parser.add_argument("--open", help="comma separated open pull request numbers, the others are collected")
+    gc_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "up":
+        for name, value in sorted(up(args.pr, args.base_stack).items()):
+            print("%s: %s" % (name, value))
+    elif args.command == "destroy":
+        destroy(stack_name(args.pr))
+    else:
+        open_prs = None if args.open is None else {pr.strip() for pr in args.open.split(",") if pr.strip()}
+        gc(args.ttl, open_prs, args.dry_run)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
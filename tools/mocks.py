@@ -0,0 +1,234 @@
+"""Run the Pulumi program offline under runtime mocks and record the resource graph"""
+
+import inspect
+import os
+import runpy
+import sys
+
+import pulumi
+from pulumi.runtime import rpc
+from pulumi.runtime.mocks import MockMonitor
+from pulumi.runtime.stack import wait_for_rpcs
+from pulumi.runtime.sync_await import _sync_await
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAM = os.path.join(PROJECT_DIR, "__main__.py")
+PROJECT = "pulumi-exercise"
+STACK = "gcp"
+STACK_TYPE = "pulumi:pulumi:Stack"
+
+# Computed outputs the program reads back from the provider, keyed by resource type.
+# Everything else just echoes the inputs.
+COMPUTED_OUTPUTS = {
+    "gcp:serviceaccount/account:Account": lambda name, inputs: {
+        "email": inputs["accountId"] + "@" + inputs.get("project", "project") + ".iam.gserviceaccount.com",
+    },
+    "gcp:container/cluster:Cluster": lambda name, inputs: {
+        "endpoint": "203.0.113.10",
+        "masterAuth": {"clusterCaCertificate": "Y2EtY2VydGlmaWNhdGU="},
+    },
+    "gcp:sql/databaseInstance:DatabaseInstance": lambda name, inputs: {
+        "connectionName": "project:" + inputs.get("region", "region") + ":" + name,
+        "privateIpAddress": "10.100.0.3",
+    },
+    "gcp:storage/bucket:Bucket": lambda name, inputs: {
+        "url": "gs://" + name,
+    },
+    "gcp:logging/projectSink:ProjectSink": lambda name, inputs: {
+        "writerIdentity": "serviceAccount:service-123456789@gcp-sa-logging.iam.gserviceaccount.com",
+    },
+    # a base stack's exports, for programs reading one through a StackReference
+    "pulumi:pulumi:StackReference": lambda name, inputs: {
+        "outputs": {
+            "projectId": "project",
+            "clusterName": "onxp-cluster",
+            "clusterEndpoint": "203.0.113.10",
+            "clusterCaCertificate": "Y2EtY2VydGlmaWNhdGU=",
+            "sqlInstanceName": "onxp-sql",
+            "bucketName": "onxp-bucket",
+        },
+        "secretOutputNames": [],
+    },
+    "gcp:filestore/instance:Instance": lambda name, inputs: {
+        "networks": [dict(network, ipAddresses=["10.100.1.2"]) for network in inputs.get("networks", [])],
+    },
+}
+
+class RegisteredResource:
+    def __init__(self,
+                 urn: str,
+                 type: str,
+                 name: str,
+                 parent: str,
+                 dependencies,
+                 inputs: dict,
+                 custom: bool,
+                 custom_timeouts=None,
+                 provider: str=None,
+                 ignore_changes=None):
+        self.urn = urn
+        self.type = type
+        self.name = name
+        self.parent = parent
+        self.dependencies = dependencies
+        self.inputs = inputs
+        self.custom = custom
+        self.custom_timeouts = custom_timeouts
+        # urn of the explicit provider, None for the default one
+        self.provider = provider
+        self.ignore_changes = ignore_changes or []
+
+class ProgramGraph:
+    def __init__(self, resources, components, program_globals):
+        # urn -> RegisteredResource, in registration order
+        self.resources = resources
+        # every ComponentResource instance the program created, nested ones included, mapped to
+        # every urn they own
+        self.components = components
+        self.program_globals = program_globals
+
+    def children(self):
+        children = {}
+        for resource in self.resources.values():
+            children.setdefault(resource.parent, set()).add(resource.urn)
+        return children
+
+    def dependents(self):
+        # reverse edges: urn -> urns that depend on it, directly or through their parent
+        dependents = {}
+        for resource in self.resources.values():
+            for dependency in resource.dependencies:
+                dependents.setdefault(dependency, set()).add(resource.urn)
+            if resource.parent:
+                dependents.setdefault(resource.parent, set()).add(resource.urn)
+        return dependents
+
+    def expand_dependents(self, urns):
+        dependents = self.dependents()
+        affected = set()
+        pending = list(urns)
+        while pending:
+            urn = pending.pop()
+            if urn in affected:
+                continue
+            affected.add(urn)
+            pending.extend(dependents.get(urn, ()))
+        return affected
+
+    def urns_by_file(self):
+        by_file = {}
+        for component, urns in self.components:
+            path = os.path.relpath(inspect.getfile(type(component)), PROJECT_DIR)
+            by_file.setdefault(path, set()).update(urns)
+        return by_file
+
+class StackMocks(pulumi.runtime.Mocks):
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+        outputs = dict(args.inputs)
+        outputs.setdefault("name", args.name)
+        outputs.setdefault("selfLink", "https://www.googleapis.com/mock/" + args.name)
+        computed = COMPUTED_OUTPUTS.get(args.typ)
+        if computed is not None:
+            outputs.update(computed(args.name, args.inputs))
+        return args.name + "_id", outputs
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
+        return {}
+
+class RecordingMonitor(MockMonitor):
+    def __init__(self, mocks: pulumi.runtime.Mocks):
+        super().__init__(mocks)
+        self.registered = {}
+        self._qualified_types = {}
+
+    # The stock mock only keeps the last parent type; the engine keeps the whole chain
+    # (minus the stack), and targeted runs need the real urns.
+    def make_urn(self, parent: str, type_: str, name: str) -> str:
+        qualified_type = type_
+        parent_type = self._qualified_types.get(parent)
+        if parent_type is not None and parent_type != STACK_TYPE:
+            qualified_type = parent_type + "$" + type_
+        urn = "urn:pulumi:" + "::".join([pulumi.get_stack(), pulumi.get_project(), qualified_type, name])
+        self._qualified_types[urn] = qualified_type
+        return urn
+
+    def RegisterResource(self, request):
+        response = super().RegisterResource(request)
+        if request.type != STACK_TYPE:
+            timeouts = request.customTimeouts
+            self.registered[response.urn] = RegisteredResource(
+                urn=response.urn,
+                type=request.type,
+                name=request.name,
+                parent=request.parent,
+                dependencies=list(request.dependencies),
+                inputs=rpc.deserialize_properties(request.object),
+                custom=request.custom,
+                custom_timeouts={
+                    "create": timeouts.create,
+                    "update": timeouts.update,
+                    "delete": timeouts.delete,
+                } if request.HasField("customTimeouts") else None,
+                # provider references are "<urn>::<id>"
+                provider=request.provider.rsplit("::", 1)[0] if request.provider else None,
+                ignore_changes=list(request.ignoreChanges))
+        return response
+
+def resource_urn(resource: pulumi.Resource) -> str:
+    return _sync_await(resource.urn.future())
+
+def owned_resources(component: pulumi.ComponentResource):
+    # children registered with parent=self, plus resources the component keeps as attributes
+    # (some components create resources without parenting them)
+    owned = []
+    for value in vars(component).values():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        owned.extend(v for v in values if isinstance(v, pulumi.Resource))
+    return owned
+
+def set_mocks(mocks: pulumi.runtime.Mocks = None, stack: str = STACK, preview=False) -> RecordingMonitor:
+    mocks = mocks or StackMocks()
+    monitor = RecordingMonitor(mocks)
+    pulumi.runtime.set_mocks(mocks, project=PROJECT, stack=stack, preview=preview, monitor=monitor)
+    return monitor
+
+def collect(monitor: RecordingMonitor, program_globals: dict, instances=None) -> ProgramGraph:
+    """instances: the ComponentResources created by the program, the ones in its globals when None"""
+    _sync_await(wait_for_rpcs())
+
+    children = {}
+    for resource in monitor.registered.values():
+        children.setdefault(resource.parent, set()).add(resource.urn)
+
+    if instances is None:
+        instances = [value for value in program_globals.values() if isinstance(value, pulumi.ComponentResource)]
+    components = []
+    for value in instances:
+        pending = [resource_urn(value)] + [resource_urn(r) for r in owned_resources(value)]
+        urns = set()
+        while pending:
+            urn = pending.pop()
+            if urn not in urns:
+                urns.add(urn)
+                pending.extend(children.get(urn, ()))
+        components.append((value, urns))
+    return ProgramGraph(monitor.registered, components, program_globals)
+
+def run_program(program: str = PROGRAM, stack: str = STACK, mocks: pulumi.runtime.Mocks = None) -> ProgramGraph:
+    monitor = set_mocks(mocks, stack=stack)
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    # record every component as it is constructed, the globals miss the ones nested in others
+    instances = []
+    component_init = pulumi.ComponentResource.__init__
+
+    def recording_init(component, *args, **kwargs):
+        component_init(component, *args, **kwargs)
+        instances.append(component)
+
+    pulumi.ComponentResource.__init__ = recording_init
+    try:
+        program_globals = runpy.run_path(program, run_name="__main__")
+    finally:
+        pulumi.ComponentResource.__init__ = component_init
+    return collect(monitor, program_globals, instances)
@@ -0,0 +1,109 @@
+"""Offline plan snapshot: diff the resource graph the program registers against the committed one
+
+Usage: python -m tools.plan_snapshot [check|update] [--stack NAME] [--snapshot PATH]
+
+check (default) runs the program under mocks, nothing leaves the process and no credentials
+are needed, and fails when the registered resources differ from the snapshot. update rewrites
+the snapshot; commit it together with the change so the diff shows up in review.
+"""
+
+import argparse
+import difflib
+import json
+import os
+import sys
+from pulumi.runtime import rpc
+from tools.mocks import PROJECT_DIR, STACK, run_program
+
+SNAPSHOT_DIR = os.path.join(PROJECT_DIR, "snapshots")
+
+def snapshot_path(stack: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, stack + ".json")
+
+def _canonical(value):
+    # secrets are masked, the snapshot is committed
+    if isinstance(value, dict):
+        if value.get(rpc._special_sig_key) == rpc._special_secret_sig:
+            return "[secret]"
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        # numbers come back from the wire as floats
+        return int(value)
+    return value
+
+def snapshot(graph) -> dict:
+    """{urn: {type, name, parent, dependencies, inputs}}, independent of registration order"""
+    resources = {}
+    for resource in graph.resources.values():
+        entry = {
+            "type": resource.type,
+            "name": resource.name,
+            "parent": resource.parent or None,
+            "dependencies": sorted(set(resource.dependencies)),
+            "inputs": _canonical(resource.inputs),
+        }
+        if resource.custom_timeouts is not None:
+            entry["customTimeouts"] = resource.custom_timeouts
+        if resource.provider is not None:
+            entry["provider"] = resource.provider
+        resources[resource.urn] = entry
+    return resources
+
+def dumps(resources: dict) -> str:
+    return json.dumps(resources, indent=2, sort_keys=True) + "\n"
+
+def load(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def diff(old: dict, new: dict):
+    """Returns (added, removed, changed) urns and a unified diff of the changed resources"""
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(old.keys() - new.keys())
+    changed = sorted(urn for urn in old.keys() & new.keys() if old[urn] != new[urn])
+    lines = []
+    for urn in changed:
+        lines.extend(difflib.unified_diff(
+            dumps(old[urn]).splitlines(), dumps(new[urn]).splitlines(),
+            fromfile="snapshot: " + urn, tofile="program: " + urn, lineterm=""))
+    return added, removed, changed, lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["check", "update"], nargs="?", default="check")
+    parser.add_argument("--stack", default=STACK)
+    parser.add_argument("--snapshot", help="snapshot file, snapshots/<stack>.json by default")
+    args = parser.parse_args(argv)
+
+    path = args.snapshot or snapshot_path(args.stack)
+    current = snapshot(run_program(stack=args.stack))
+
+    if args.command == "update":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(dumps(current))
+        print("wrote %d resources to %s" % (len(current), os.path.relpath(path)))
+        return 0
+
+    if not os.path.exists(path):
+        print("no snapshot at %s, run update first" % os.path.relpath(path))
+        return 1
+    added, removed, changed, lines = diff(load(path), current)
+    for urn in added:
+        print("+ " + urn)
+    for urn in removed:
+        print("- " + urn)
+    for urn in changed:
+        print("~ " + urn)
+    for line in lines:
+        print(line)
+    print("%d added, %d removed, %d changed of %d resources" % (len(added), len(removed), len(changed), len(current)))
+    return 1 if added or removed or changed else 0
+
+if __name__ == "__main__":
+    os.chdir(PROJECT_DIR)
+    sys.exit(main())
@@ -0,0 +1,21 @@
+"""Automation API helpers shared by the command line tools"""
+
+import sys
+from pulumi import automation as auto
+from components.base import DEFAULT_RETRY_POLICY, RetryPolicy
+from tools.mocks import PROJECT_DIR, STACK
+
+# https://www.pulumi.com/docs/using-pulumi/automation-api/
+def select_stack(stack_name: str = STACK) -> auto.Stack:
+    return auto.select_stack(stack_name=stack_name, work_dir=PROJECT_DIR)
+
+def on_output(line: str):
+    print(line, file=sys.stderr)
+
+def run_with_retry(operation, policy: RetryPolicy = DEFAULT_RETRY_POLICY):
+    """Reruns a stack operation (up/refresh/destroy...) on transient GCP errors. The rerun
+    continues from the state the failed run saved instead of starting over."""
+    def on_retry(error, delay):
+        lines = str(error).strip().splitlines() or [""]
+        print("transient error, retrying in %ds: %s" % (delay, lines[-1]), file=sys.stderr)
+    return policy.run(operation, on_retry=on_retry)
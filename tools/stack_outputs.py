@@ -0,0 +1,153 @@
+"""Cached stack outputs for scripts and app config generators
+
+Usage: python -m tools.stack_outputs [KEY ...] [--stack NAME] [--refresh]
+       e.g. python -m tools.stack_outputs sql onxp-sql connectionName
+
+In Python:
+    from tools.stack_outputs import lookup
+    lookup("serviceAccounts", "onxp-db-sa")
+
+`pulumi stack output` takes seconds per call. The outputs are read once and written to
+.stack-outputs/<stack>.json together with the stack version (update counter). The cache is
+trusted for max_age seconds, then one history call checks the version and the outputs are only
+read again when the stack was updated since. Lookups after the first are dict reads.
+The tools that update or destroy a stack (targeted_deploy, ephemeral, teardown, drift_refresh
+--apply) call invalidate() when they are done, max_age only bounds how long a `pulumi up` run
+outside of them can go unnoticed.
+Secret outputs are never written to the cache file, they are read from the stack when asked for.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from tools.mocks import PROJECT_DIR, STACK
+
+CACHE_DIR = os.path.join(PROJECT_DIR, ".stack-outputs")
+
+_MISSING = object()
+
+class StackOutputs:
+    def __init__(self,
+                 stack_name: str=STACK,
+                 max_age: float=60,
+                 cache_dir: str=CACHE_DIR):
+        self.stack_name = stack_name
+        # seconds the cache is trusted before the stack version is checked again
+        self.max_age = max_age
+        self.path = os.path.join(cache_dir, stack_name + ".json")
+        self._outputs = None
+        self._secrets = set()
+        self._version = None
+        # wall clock of the last version check, shared with other processes through the file
+        self._checked_at = 0
+        self._stack = None
+
+    def _select(self):
+        # imported lazily: plain cache hits never start the pulumi CLI
+        if self._stack is None:
+            from tools.stack import select_stack
+            self._stack = select_stack(self.stack_name)
+        return self._stack
+
+    def _current_version(self):
+        history = self._select().history(page_size=1)
+        return history[0].version if history else None
+
+    def _read_cache(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            cache = json.load(f)
+        self._outputs = cache["outputs"]
+        self._secrets = set(cache.get("secrets", []))
+        self._version = cache["version"]
+        self._checked_at = cache["checked_at"]
+        return True
+
+    def _write_cache(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "version": self._version,
+                "checked_at": self._checked_at,
+                "outputs": {k: v for k, v in self._outputs.items() if k not in self._secrets},
+                "secrets": sorted(self._secrets),
+            }, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def refresh(self, version=_MISSING):
+        """Reads every output from the stack and rewrites the cache"""
+        outputs = self._select().outputs()
+        self._outputs = {name: output.value for name, output in outputs.items()}
+        self._secrets = {name for name, output in outputs.items() if output.secret}
+        self._version = self._current_version() if version is _MISSING else version
+        self._checked_at = time.time()
+        self._write_cache()
+
+    def _ensure_fresh(self):
+        if self._outputs is not None and time.time() - self._checked_at < self.max_age:
+            return
+        if self._outputs is None and self._read_cache() and time.time() - self._checked_at < self.max_age:
+            return
+        version = self._current_version()
+        if self._outputs is not None and version == self._version:
+            self._checked_at = time.time()
+            self._write_cache()
+            return
+        self.refresh(version)
+
+    def get(self, *keys, default=_MISSING):
+        """Output value under keys, e.g. get("sql", "onxp-sql", "privateIp")"""
+        self._ensure_fresh()
+        if keys and keys[0] in self._secrets and keys[0] not in self._outputs:
+            # not in the file, read it from the stack for this process only
+            self._outputs[keys[0]] = self._select().outputs()[keys[0]].value
+        value = self._outputs
+        try:
+            for key in keys:
+                value = value[key]
+        except (KeyError, IndexError, TypeError):
+            if default is _MISSING:
+                raise KeyError(".".join(str(key) for key in keys) + " is not a stack output") from None
+            return default
+        return value
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+_instances = {}
+
+def invalidate(stack_name: str=STACK, cache_dir: str=CACHE_DIR):
+    """Drops the cached outputs of a stack, call it after an up, refresh or destroy"""
+    _instances.pop(stack_name, None)
+    try:
+        os.remove(os.path.join(cache_dir, stack_name + ".json"))
+    except FileNotFoundError:
+        pass
+
+def lookup(*keys, stack_name: str=STACK, default=_MISSING):
+    """Module level shortcut sharing one StackOutputs per stack in the process"""
+    outputs = _instances.get(stack_name)
+    if outputs is None:
+        outputs = _instances[stack_name] = StackOutputs(stack_name)
+    return outputs.get(*keys, default=default)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("keys", nargs="*", help="path into the outputs, every output when empty")
+    parser.add_argument("--stack", default=STACK)
+    parser.add_argument("--refresh", action="store_true", help="ignore the cache")
+    args = parser.parse_args(argv)
+
+    outputs = StackOutputs(args.stack)
+    if args.refresh:
+        outputs.refresh()
+    value = outputs.get(*args.keys)
+    print(value if isinstance(value, str) else json.dumps(value, indent=2, sort_keys=True))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Scale stress: how registration time, memory and Output resolution grow with stack size
+
+Builds N synthetic copies of the Vpc/Subnetwork/Firewall/ServiceAccount/IamMember/StorageBucket
+group under runtime mocks (nothing leaves the process) for each N and prints one row per size.
+
+Usage: python -m tools.stress [--sizes 10,100,1000] [--memory] [--top 0]
+
+tracemalloc slows registration down several times, so timings are only meaningful
+without --memory.
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+import pulumi
+from pulumi.runtime.stack import wait_for_rpcs
+from pulumi.runtime.sync_await import _sync_await
+from pulumi_gcp import compute, storage
+from components.vpc import Vpc, VpcArgs
+from components.subnetwork import Subnetwork, SubnetworkArgs, IpRangeArgs
+from components.firewall import Firewall, FirewallArgs
+from components.sa import ServiceAccount, ServiceAccountArgs, IamMember, IamMemberArgs
+from components.gcs import StorageBucket, StorageBucketArgs
+from tools.mocks import set_mocks
+
+# registered per group: 6 components + 6 resources
+RESOURCES_PER_GROUP = 12
+
+def build_group(i: int):
+    name = "stress-%d" % i
+    vpc = Vpc(name, "gcp:modules:vpc:stress", VpcArgs(name=name))
+    subnetwork = Subnetwork(
+        name, "gcp:modules:subnetwork:stress",
+        SubnetworkArgs(
+            name=name,
+            network=vpc.vpc,
+            ip_cidr_range=IpRangeArgs(ip_cidr_range="10.0.0.0/18"),
+            pod_address_range=IpRangeArgs(ip_cidr_range="10.48.0.0/14", range_name="pods"),
+            service_address_range=IpRangeArgs(ip_cidr_range="10.52.0.0/20", range_name="services")))
+    Firewall(
+        name, "gcp:modules:firewall:stress",
+        FirewallArgs(
+            name=name,
+            network=vpc.vpc,
+            source_ranges=["10.0.0.0/8"],
+            allows=[compute.FirewallAllowArgs(protocol="tcp", ports=["443"])]))
+    sa = ServiceAccount(
+        name, "gcp:modules:sa:stress",
+        ServiceAccountArgs(name=name, account_id=name, project_id="stress-project"))
+    IamMember(name, "gcp:modules:sa:iam:stress", IamMemberArgs(role="roles/viewer", serviceaccount=sa.service_account))
+    StorageBucket(
+        name, "gcp:modules:storage:bucket:stress",
+        StorageBucketArgs(
+            name,
+            location="US",
+            storage_class="STANDARD",
+            lifecycle_rules=[storage.BucketLifecycleRuleArgs(
+                condition=storage.BucketLifecycleRuleConditionArgs(age=30),
+                action=storage.BucketLifecycleRuleActionArgs(type="Delete"))],
+            versioning=storage.BucketVersioningArgs(enabled=True)))
+    return sa.service_account.email, subnetwork.subnetwork.self_link
+
+def run(n: int, memory: bool, top: int):
+    set_mocks(stack="stress")
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+
+    outputs = []
+    for i in range(n):
+        outputs.extend(build_group(i))
+    constructed = time.perf_counter()
+
+    _sync_await(wait_for_rpcs())
+    registered = time.perf_counter()
+
+    # every registration is done, this is the cost of resolving Outputs the program reads back
+    _sync_await(pulumi.Output.all(*outputs).future())
+    resolved = time.perf_counter()
+
+    snapshot, peak = None, None
+    if memory:
+        snapshot = tracemalloc.take_snapshot() if top else None
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    resources = n * RESOURCES_PER_GROUP
+    print("%7d %9d %10.2f %10.2f %12.0f %10.2f %10s %10s" % (
+        n, resources,
+        constructed - start,
+        registered - start,
+        resources / (registered - start),
+        (resolved - registered) * 1000,
+        "-" if peak is None else "%.1f" % (peak / 2**20),
+        "-" if peak is None else "%.2f" % (peak / resources / 1024)))
+    if snapshot is not None:
+        for stat in snapshot.statistics("lineno")[:top]:
+            print("        " + str(stat))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000", help="comma separated group counts")
+    parser.add_argument("--memory", action="store_true", help="trace peak memory with tracemalloc")
+    parser.add_argument("--top", type=int, default=0, help="with --memory, print the top allocation sites for each size")
+    args = parser.parse_args(argv)
+
+    print("%7s %9s %10s %10s %12s %10s %10s %10s" % (
+        "groups", "resources", "build s", "register s", "resources/s", "resolve ms", "peak MiB", "KiB/res"))
+    for n in (int(size) for size in args.sizes.split(",")):
+        run(n, args.memory, args.top)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
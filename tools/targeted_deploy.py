@@ -0,0 +1,104 @@
+"""Change-scoped preview/up: only target the resources registered by the files changed in git
+
+Usage: python -m tools.targeted_deploy [preview|up] [--base REF] [--stack NAME] [--dry-run]
+
+Resources that were removed or renamed aren't registered anymore, so they are found by comparing
+the stack state with the program and targeted too (a targeted up deletes them). --dry-run works
+offline and only shows the targets of the program.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from tools.mocks import PROJECT_DIR, STACK, run_program
+from tools.stack_outputs import invalidate
+
+# Files that never change what the program registers
+IGNORED_PREFIXES = ("tools/", ".github/", "snapshots/", "ephemeral/")
+IGNORED_SUFFIXES = (".md",)
+
+def changed_files(base: str):
+    def git(*args):
+        out = subprocess.run(["git", *args], cwd=PROJECT_DIR, check=True, capture_output=True, text=True).stdout
+        return [line for line in out.splitlines() if line]
+
+    files = set(git("diff", "--name-only", base, "--"))
+    files.update(git("ls-files", "--others", "--exclude-standard"))
+    return sorted(f for f in files
+                  if not f.startswith(IGNORED_PREFIXES) and not f.endswith(IGNORED_SUFFIXES))
+
+def affected_urns(files, graph):
+    """Returns (urns, reason). urns is None when the change can't be mapped with certainty."""
+    by_file = graph.urns_by_file()
+    seeds = set()
+    for path in files:
+        if path not in by_file:
+            # __main__.py, variables, stack config, requirements... can touch anything
+            return None, path + " is not owned by any component"
+        seeds.update(by_file[path])
+    return graph.expand_dependents(seeds), None
+
+def removed_urns(resources, graph):
+    """resources: checkpoint resources from `pulumi stack export`. Returns the urns in the state
+    the program doesn't register anymore (removed or renamed)"""
+    return {resource["urn"] for resource in resources
+            if resource["type"] != "pulumi:pulumi:Stack"
+            and not resource["type"].startswith("pulumi:providers:")
+            and resource["urn"] not in graph.resources}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["preview", "up"], nargs="?", default="preview")
+    parser.add_argument("--base", default="HEAD", help="git ref to diff the working tree against")
+    parser.add_argument("--stack", default=STACK)
+    parser.add_argument("--dry-run", action="store_true", help="print the targets and exit")
+    args = parser.parse_args(argv)
+
+    files = changed_files(args.base)
+    if not files:
+        print("no changes against " + args.base)
+        return 0
+
+    try:
+        graph = run_program(stack=args.stack)
+        urns, reason = affected_urns(files, graph)
+    except Exception as e:
+        urns, reason = None, "program failed under mocks: " + str(e)
+
+    stack = None
+    if urns is not None and not args.dry_run:
+        from tools.stack import select_stack
+        stack = select_stack(args.stack)
+        try:
+            removed = removed_urns(stack.export_stack().deployment.get("resources", []), graph)
+        except Exception as e:
+            urns, reason = None, "can't compare with the stack state: " + str(e)
+        else:
+            urns = urns | removed
+
+    if urns is None:
+        print("full run: " + reason)
+    else:
+        print("targeting %d of %d resources:" % (len(urns), len(graph.resources)))
+        for urn in sorted(urns):
+            print("  " + urn)
+    if args.dry_run or (urns is not None and not urns):
+        return 0
+
+    from tools.stack import select_stack, on_output, run_with_retry
+    stack = stack or select_stack(args.stack)
+    targets = {} if urns is None else {"target": sorted(urns), "target_dependents": True}
+    if args.command == "preview":
+        run_with_retry(lambda: stack.preview(on_output=on_output, **targets))
+        return 0
+    try:
+        run_with_retry(lambda: stack.up(on_output=on_output, **targets))
+    finally:
+        # a failed up may still have changed outputs
+        invalidate(args.stack)
+    return 0
+
+if __name__ == "__main__":
+    os.chdir(PROJECT_DIR)
+    sys.exit(main())
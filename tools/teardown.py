@@ -0,0 +1,161 @@
+"""Unattended teardown: destroy the stack in dependency layers, peering connection last
+
+Usage: python -m tools.teardown [--stack NAME] [--parallel 20] [--dry-run]
+
+A plain `pulumi destroy` gets stuck on the service networking connection: Cloud SQL
+(and the other private service access producers) keep using the peering for a while
+after their instances are deleted, and deleting the connection fails until they let go.
+This destroys the resources layer by layer, dependents first, each layer in one
+parallel destroy. The connection only goes after every peering consumer is gone, is
+retried with backoff while the producers still hold it, and as a last resort the
+peering is deleted directly and the connection refreshed out of the state (the manual
+trick described in __main__.py).
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from components.base import RetryPolicy, TRANSIENT_ERRORS
+from tools.mocks import PROJECT_DIR, STACK
+from tools.stack import select_stack, on_output, run_with_retry
+from tools.stack_outputs import invalidate
+
+CONNECTION = "gcp:servicenetworking/connection:Connection"
+# Resources that sit behind the service networking peering, whether or not the
+# program declares a dependency on the connection
+PEERING_CONSUMERS = (
+    "gcp:sql/databaseInstance:DatabaseInstance",
+    "gcp:filestore/instance:Instance",
+    "gcp:redis/instance:Instance",
+    "gcp:memcache/instance:Instance",
+    "gcp:cloudbuild/workerPool:WorkerPool",
+)
+
+# Producers release the peering minutes after their instances are deleted
+PEERING_IN_USE = [
+    r"Producer services .* are still using this connection",
+    r"Failed to delete connection",
+    r"RESOURCE_PREVENTING_DELETE",
+]
+PEERING_RETRY_POLICY = RetryPolicy(max_attempts=8, initial_delay=60, max_delay=600,
+                                   transient_errors=TRANSIENT_ERRORS + PEERING_IN_USE)
+
+def _default_provider(resource):
+    return resource["type"].startswith("pulumi:providers:") and resource["urn"].rsplit("::", 1)[-1].startswith("default")
+
+def _custom(resources):
+    # explicit providers are destroyed in their own layer, after everything using them and
+    # before what they depend on (the kubernetes provider before the cluster). Default providers
+    # go with the final destroy.
+    return {r["urn"]: r for r in resources if r.get("custom") and not _default_provider(r)}
+
+def layers(resources):
+    """resources: checkpoint resources from `pulumi stack export`. Returns lists of custom
+    resource and explicit provider urns; each layer only depends on the layers after it."""
+    custom = _custom(resources)
+    children = {}
+    for resource in resources:
+        if resource.get("parent"):
+            children.setdefault(resource["parent"], []).append(resource["urn"])
+
+    def expand(urn):
+        # a dependency on a component is a dependency on everything under it
+        if urn in custom:
+            return {urn}
+        expanded = set()
+        for child in children.get(urn, ()):
+            expanded |= expand(child)
+        return expanded
+
+    dependents = {urn: set() for urn in custom}
+    for urn, resource in custom.items():
+        dependencies = set(resource.get("dependencies") or [])
+        for property_dependencies in (resource.get("propertyDependencies") or {}).values():
+            dependencies.update(property_dependencies)
+        if resource.get("provider"):
+            # "<provider urn>::<provider id>"
+            dependencies.add(resource["provider"].rsplit("::", 1)[0])
+        for dependency in dependencies:
+            for target in expand(dependency):
+                if target != urn:
+                    dependents[target].add(urn)
+    connections = [urn for urn, r in custom.items() if r["type"] == CONNECTION]
+    for urn, resource in custom.items():
+        if resource["type"] in PEERING_CONSUMERS:
+            for connection in connections:
+                dependents[connection].add(urn)
+
+    result = []
+    remaining = set(custom)
+    while remaining:
+        layer = sorted(urn for urn in remaining if not dependents[urn] & remaining)
+        if not layer:
+            raise ValueError("dependency cycle between " + ", ".join(sorted(remaining)))
+        result.append(layer)
+        remaining.difference_update(layer)
+    return result
+
+def _peering(connection):
+    outputs = connection.get("outputs") or {}
+    # projects/<project>/global/networks/<network>
+    network = (outputs.get("network") or connection["inputs"]["network"]).split("/")
+    project = network[network.index("projects") + 1] if "projects" in network else None
+    return outputs.get("peering"), network[-1], project
+
+def remove_peering(stack, connection):
+    """Deletes the VPC peering behind a connection GCP refuses to delete, then refreshes the
+    connection so it drops out of the state."""
+    peering, network, project = _peering(connection)
+    command = ["gcloud", "compute", "networks", "peerings", "delete", peering, "--network", network, "--quiet"]
+    if project:
+        command += ["--project", project]
+    print("deleting peering %s on %s directly" % (peering, network), file=sys.stderr)
+    subprocess.run(command, check=True)
+    run_with_retry(lambda: stack.refresh(target=[connection["urn"]], on_output=on_output))
+
+def destroy_connection(stack, connection, parallel: int):
+    try:
+        run_with_retry(lambda: stack.destroy(target=[connection["urn"]], parallel=parallel, on_output=on_output),
+                       PEERING_RETRY_POLICY)
+    except Exception as e:
+        if not PEERING_RETRY_POLICY.is_transient(str(e)):
+            raise
+        remove_peering(stack, connection)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stack", default=STACK)
+    parser.add_argument("--parallel", type=int, default=20, help="resources destroyed concurrently per layer")
+    parser.add_argument("--dry-run", action="store_true", help="print the layers and exit")
+    args = parser.parse_args(argv)
+
+    stack = select_stack(args.stack)
+    resources = stack.export_stack().deployment.get("resources", [])
+    custom = _custom(resources)
+    plan = layers(resources)
+    for i, layer in enumerate(plan):
+        print("layer %d: %d resources" % (i, len(layer)))
+        for urn in layer:
+            print("  " + urn)
+    if args.dry_run:
+        return 0
+
+    try:
+        for i, layer in enumerate(plan):
+            connections = [urn for urn in layer if custom[urn]["type"] == CONNECTION]
+            others = [urn for urn in layer if urn not in connections]
+            if others:
+                print("destroying layer %d (%d resources)" % (i, len(others)), file=sys.stderr)
+                run_with_retry(lambda: stack.destroy(target=others, parallel=args.parallel, on_output=on_output))
+            for urn in connections:
+                destroy_connection(stack, custom[urn], args.parallel)
+        # components, providers and the stack itself
+        run_with_retry(lambda: stack.destroy(parallel=args.parallel, on_output=on_output))
+    finally:
+        invalidate(args.stack)
+    return 0
+
+if __name__ == "__main__":
+    os.chdir(PROJECT_DIR)
+    sys.exit(main())